@@ -3,12 +3,14 @@
 
 import datetime as dt
 import numpy as np
-from scipy.stats import norm
+import pandas as pd
+from scipy.special import ndtr
 from .. import tools, volatility as vol
 
 # package info
 __all__ = [
-    'binomialtree'
+    'binomialtree',
+    'montecarlo',
 ]
 
 __author__ = 'Felipe Oliveira'
@@ -16,9 +18,14 @@ __version__ = '1.4.0'
 
 # black scholes merton
 class BlackScholes:
-    """Black-Scholes-Merton european call pricing model
+    """Black-Scholes-Merton european call pricing model.
+
+    Every input may also be a numpy array: inputs are broadcast against each other and all prices and greeks are arrays.
+    The terms shared by prices and greeks (d1, d2, discount factors and normal distribution terms) are computed once, on instantiation.
     """
 
+    greek_names = ['call', 'put', 'call_delta', 'put_delta', 'gamma', 'vega', 'call_theta', 'put_theta', 'call_rho', 'put_rho']
+
     def __init__(self,
         S0: float,
         K: float,
@@ -48,26 +55,277 @@ class BlackScholes:
         self.vol = self._get_check_vol(vol)
 
         # calculation
-        self.d1 = (np.log(self.S0 / self.K) + (self.r - self.q + self.vol**2 / 2) * self.T) / (self.vol * np.sqrt(self.T))
-        self.d2 = self.d1 - self.vol * np.sqrt(self.T)
+        sqrt_T = np.sqrt(self.T)
+        self.d1 = (np.log(self.S0 / self.K) + (self.r - self.q + self.vol**2 / 2) * self.T) / (self.vol * sqrt_T)
+        self.d2 = self.d1 - self.vol * sqrt_T
+
+        # terms shared by prices and greeks. ndtr is the standard normal cdf ufunc (without the overhead of scipy.stats distributions)
+        self._sqrt_T = sqrt_T
+        self._spot_discounted = self.S0 * np.exp(-self.q * self.T)
+        self._strike_discounted = self.K * np.exp(-self.r * self.T)
+        self._pdf_d1 = np.exp(-self.d1**2 / 2) / np.sqrt(2 * np.pi)
+        self._cdf_d1, self._cdf_d2 = ndtr(self.d1), ndtr(self.d2)
+        self._cdf_minus_d1, self._cdf_minus_d2 = ndtr(-self.d1), ndtr(-self.d2)
 
     @property
     def call(self):
         """call price"""
-        return self.S0 * np.exp(-self.q * self.T) * norm.cdf(self.d1) - self.K * np.exp(-self.r * self.T) * norm.cdf(self.d2)
+        return self._spot_discounted * self._cdf_d1 - self._strike_discounted * self._cdf_d2
     
     @property
     def put(self):
         """put price"""
-        return self.K * np.exp(-self.r * self.T) * norm.cdf(-self.d2) - self.S0 * np.exp(-self.q * self.T) * norm.cdf(-self.d1)
+        return self._strike_discounted * self._cdf_minus_d2 - self._spot_discounted * self._cdf_minus_d1
+
+    @property
+    def call_delta(self):
+        """sensitivity of the call price to the spot price"""
+        return self._spot_discounted / self.S0 * self._cdf_d1
+
+    @property
+    def put_delta(self):
+        """sensitivity of the put price to the spot price"""
+        return -self._spot_discounted / self.S0 * self._cdf_minus_d1
+
+    @property
+    def gamma(self):
+        """sensitivity of delta to the spot price (same for calls and puts)"""
+        return self._spot_discounted * self._pdf_d1 / (self.S0**2 * self.vol * self._sqrt_T)
+
+    @property
+    def vega(self):
+        """sensitivity of the price to the volatility, per unit of volatility (same for calls and puts)"""
+        return self._spot_discounted * self._pdf_d1 * self._sqrt_T
+
+    @property
+    def call_theta(self):
+        """sensitivity of the call price to the passage of time, per unit of time"""
+        return (
+            -self._spot_discounted * self._pdf_d1 * self.vol / (2 * self._sqrt_T)
+            - self.r * self._strike_discounted * self._cdf_d2 
+            + self.q * self._spot_discounted * self._cdf_d1
+        )
+
+    @property
+    def put_theta(self):
+        """sensitivity of the put price to the passage of time, per unit of time"""
+        return (
+            -self._spot_discounted * self._pdf_d1 * self.vol / (2 * self._sqrt_T)
+            + self.r * self._strike_discounted * self._cdf_minus_d2
+            - self.q * self._spot_discounted * self._cdf_minus_d1
+        )
+
+    @property
+    def call_rho(self):
+        """sensitivity of the call price to the risk-free rate, per unit of rate"""
+        return self.T * self._strike_discounted * self._cdf_d2
+
+    @property
+    def put_rho(self):
+        """sensitivity of the put price to the risk-free rate, per unit of rate"""
+        return -self.T * self._strike_discounted * self._cdf_minus_d2
+
+    def greeks(self):
+        """call and put prices and greeks, all at once
+
+        Returns:
+            dict: one entry for each of greek_names ('call', 'put', 'call_delta', 'put_delta', 'gamma', 'vega', 'call_theta', 
+                'put_theta', 'call_rho' and 'put_rho')
+        """
+        return { name: getattr(self, name) for name in self.greek_names }
     
     def _get_check_vol(self, vol):
-        if vol < 0:
+        if np.any(np.asarray(vol) < 0):
             raise ValueError(f"Volatility must be non-negative.")
         
         return vol
 
 
+class Black76(BlackScholes):
+    """Black (1976) european futures option pricing model.
+
+    A futures contract costs nothing to enter, so its price behaves as a stock paying out dividends at the risk-free rate 
+    (q = r), as in the futures options of the tree models. S0 is the futures price and any dividend rate passed is ignored.
+    """
+
+    def __init__(self,
+        S0: float,
+        K: float,
+        r: float,
+        T: float,
+        vol: float,
+        *args, **kwargs
+    ):
+        """Black (1976) european futures option pricing model
+
+        Args:
+            S0 (float): futures price at t0
+            K (float): strike
+            r (float): risk-free rate (in % p.p.)
+            T (float): expiration (same period as the risk free rate)
+            vol (float): volatility of the futures price
+        """
+        super().__init__(S0 = S0, K = K, r = r, T = T, vol = vol, q = r)
+
+    @property
+    def call_rho(self):
+        """sensitivity of the call price to the risk-free rate, per unit of rate (the futures price doesn't move with it)"""
+        return -self.T * self.call
+
+    @property
+    def put_rho(self):
+        """sensitivity of the put price to the risk-free rate, per unit of rate (the futures price doesn't move with it)"""
+        return -self.T * self.put
+
+
+class GarmanKohlhagen(BlackScholes):
+    """Garman-Kohlhagen european currency option pricing model.
+
+    The foreign currency earns the foreign risk-free rate, which plays the part of the dividend rate (q = rf), 
+    as in the currency options of the tree models.
+    """
+
+    greek_names = BlackScholes.greek_names + ['call_rho_foreign', 'put_rho_foreign']
+
+    def __init__(self,
+        S0: float,
+        K: float,
+        r: float,
+        T: float,
+        vol: float,
+        q: float = 0,
+        *args,
+        rf: float = None,
+        **kwargs
+    ):
+        """Garman-Kohlhagen european currency option pricing model
+
+        Args:
+            S0 (float): exchange rate at t0 (price of the foreign currency)
+            K (float): strike
+            r (float): domestic risk-free rate (in % p.p.)
+            T (float): expiration (same period as the risk free rate)
+            vol (float): volatility of the exchange rate
+            q (float, optional): foreign risk-free rate, if rf isn't set. Defaults to 0.
+            rf (float, optional): foreign risk-free rate. Overrides q. Defaults to None.
+        """
+        super().__init__(S0 = S0, K = K, r = r, T = T, vol = vol, q = q if rf is None else rf)
+        self.rf = self.q
+
+    @property
+    def call_rho_foreign(self):
+        """sensitivity of the call price to the foreign risk-free rate, per unit of rate"""
+        return -self.T * self._spot_discounted * self._cdf_d1
+
+    @property
+    def put_rho_foreign(self):
+        """sensitivity of the put price to the foreign risk-free rate, per unit of rate"""
+        return self.T * self._spot_discounted * self._cdf_minus_d1
+
+
+def implied_vol(
+    price: float,
+    S0: float,
+    K: float,
+    r: float,
+    T: float,
+    q: float = 0,
+    option_type: str = 'call',
+    tol: float = 1e-8,
+    max_iter: int = 100,
+    vol_bounds: tuple = (1e-6, 5.),
+):
+    """Black-Scholes-Merton implied volatility of european option prices. Every input may be a numpy array (broadcast against each other).
+
+    Each quote starts from the Corrado-Miller approximation and is refined with Newton iterations (black-scholes vega). 
+    Whenever a Newton step leaves the bracket of volatilities known to hold the solution, it is replaced by a bisection step.
+    Only the quotes not yet converged are repriced on each iteration.
+
+    Args:
+        price (float): option prices
+        S0 (float): underlying asset spot price at t0
+        K (float): strike
+        r (float): risk-free rate (in % p.p.)
+        T (float): expiration (same period as the risk free rate)
+        q (float, optional): rate at which the underlying asset pays out dividends. Defaults to 0.
+        option_type (str, optional): 'call' or 'put' (or an array of them). Defaults to 'call'.
+        tol (float, optional): tolerance on the price. Defaults to 1e-8.
+        max_iter (int, optional): maximum number of iterations. Defaults to 100.
+        vol_bounds (tuple, optional): lowest and highest volatilities searched. Defaults to (1e-6, 5.).
+
+    Returns:
+        tuple: implied volatilities (NaN for prices out of the no-arbitrage bounds or the range of vol_bounds) 
+            and whether each quote converged within max_iter iterations
+    """
+    price, S0, K, r, T, q, option_type = np.broadcast_arrays(
+        *[ np.asarray(param, dtype = float) for param in [price, S0, K, r, T, q] ], np.asarray(option_type)
+    )
+    shape = price.shape
+
+    if not np.all(np.isin(option_type, ['call', 'put'])):
+        raise ValueError(f"option_type must be 'call' or 'put'.")
+    
+    # all quotes are solved as a flat array
+    price, S0, K, r, T, q = [ param.ravel() for param in [price, S0, K, r, T, q] ]
+    is_call = option_type.ravel() == 'call'
+
+    def objective(vol, idx = slice(None)):
+        bs = BlackScholes(S0 = S0[idx], K = K[idx], r = r[idx], T = T[idx], vol = vol, q = q[idx])
+        return np.where(is_call[idx], bs.call, bs.put) - price[idx], bs.vega
+
+    # bracket of volatilities. Quotes out of it (or out of the no-arbitrage bounds) have no solution
+    lower = np.full(price.shape, float(vol_bounds[0]))
+    upper = np.full(price.shape, float(vol_bounds[1]))
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        f_lower, _ = objective(lower)
+        f_upper, _ = objective(upper)
+    valid = np.isfinite(price) & (T > 0) & (f_lower <= tol) & (f_upper >= -tol) 
+
+    # initial guess (Corrado & Miller, 1996), on the call price (put-call parity)
+    spot_discounted = S0 * np.exp(-q * T)
+    strike_discounted = K * np.exp(-r * T)
+    call = np.where(is_call, price, price + spot_discounted - strike_discounted)
+    moneyness = (spot_discounted - strike_discounted) / 2
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        vol = (
+            np.sqrt(2 * np.pi / T) / (spot_discounted + strike_discounted) 
+            * (call - moneyness + np.sqrt(np.maximum((call - moneyness)**2 - 4 * moneyness**2 / np.pi, 0)))
+        )
+    vol = np.where(np.isfinite(vol) & (vol > lower) & (vol < upper), vol, (lower + upper) / 2)
+
+    converged = valid & ((np.abs(f_lower) <= tol) | (np.abs(f_upper) <= tol))
+    vol = np.where(np.abs(f_lower) <= tol, lower, np.where(np.abs(f_upper) <= tol, upper, vol))
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(valid & ~converged)
+        if idx.size == 0:
+            break
+
+        f, vega = objective(vol[idx], idx)
+        converged[idx] = np.abs(f) <= tol
+
+        # shrink the bracket
+        below = f < 0
+        lower[idx] = np.where(below, vol[idx], lower[idx])
+        upper[idx] = np.where(below, upper[idx], vol[idx])
+
+        # newton step, or bisection whenever it leaves the bracket
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            step = vol[idx] - f / vega
+        bisection = (lower[idx] + upper[idx]) / 2
+        step = np.where(np.isfinite(step) & (step > lower[idx]) & (step < upper[idx]), step, bisection)
+
+        vol[idx] = np.where(converged[idx], vol[idx], step)
+
+    vol = np.where(valid, vol, np.nan).reshape(shape)
+    converged = converged.reshape(shape)
+
+    if vol.ndim == 0:
+        return float(vol), bool(converged)
+
+    return vol, converged
+
+
 class BlackScholesPortfolio:  # vol.Volatility already inherits from Portfolio
     """Black-Scholes-Merton european call pricing model based on portfolios"""
 
@@ -126,6 +384,47 @@ class BlackScholesPortfolio:  # vol.Volatility already inherits from Portfolio
         """put price"""
         return self.blackscholes.put
 
+    def price_series(self, day_count: float = 365):
+        """Prices and greeks of the option on every date of the portfolio, all at once.
+
+        The option expires T after base_date. On each date, the spot price is the portfolio total and the volatility is 
+        the volatility model on that date (or the single volatility, if the model has no window). Time to expiry rolls 
+        down with the dates, and dates on or after the expiry are left out.
+
+        Args:
+            day_count (float, optional): number of calendar days in a period of the risk-free rate. Defaults to 365.
+
+        Returns:
+            pd.DataFrame: one row per date, with columns 'S0', 'vol', 'T' and the prices and greeks of BlackScholes.greeks()
+        """
+        spot = self.vol_model.portfolio_total
+        vol_bs = self.vol_model.vol
+
+        if isinstance(vol_bs, float):
+            vol_bs = pd.Series(vol_bs, index = spot.index)
+        
+        # time to expiry on each date
+        elapsed = (spot.index - pd.Timestamp(self.base_date)).days.to_numpy()
+        T = self.blackscholes.T - elapsed / day_count
+        alive = T > 0
+
+        params = pd.DataFrame(
+            { 'S0': spot.to_numpy()[alive], 'vol': vol_bs.reindex(spot.index).to_numpy()[alive], 'T': T[alive] },
+            index = spot.index[alive],
+        )
+
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            greeks = BlackScholes(
+                S0 = params['S0'].to_numpy(),
+                K = self.blackscholes.K,
+                T = params['T'].to_numpy(),
+                r = self.blackscholes.r,
+                q = self.blackscholes.q,
+                vol = params['vol'].to_numpy(),
+            ).greeks()
+
+        return params.assign(**greeks)
+
     def _get_check_base_date(self, base_date):
         if isinstance(base_date, str):
             return tools.str2dt(base_date)
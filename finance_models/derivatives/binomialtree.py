@@ -2,10 +2,262 @@
 #-*- coding: utf-8 -*-
 
 import datetime as dt
+import os
+import tempfile
+import threading
+import time
+import warnings
 from abc import abstractmethod, ABC
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+import pandas as pd
 from tqdm import tqdm
 from .. import volatility as volm, portfolio, tools
+from . import BlackScholes, Black76, GarmanKohlhagen, implied_vol, kernels
+
+
+class TreeCallback:
+    """Subscriber to the instrumentation of the tree pricing models (see the callbacks argument of the tree pricing classes).
+
+    Trees are built in phases: 'asset_tree' and 'derivative_tree' (full trees) or 'derivative_price' (backward induction
+    keeping only the current level). Every method is a no-op: subscribers override the events they need.
+    """
+
+    def on_phase_start(self, model, phase: str, levels: int):
+        """a phase of model starts, which will build the given number of levels"""
+        pass
+
+    def on_level(self, model, phase: str, step: int):
+        """the level at step of the tree is built. Levels built by the compiled kernels (see kernels) are not reported"""
+        pass
+
+    def on_phase_end(self, model, phase: str, metrics: dict):
+        """a phase of model ends, even if it raised an exception. metrics holds its duration ('seconds'), number of levels ('levels'), 
+        bytes allocated for the trees or levels ('bytes'), levels built per second ('steps_per_second'), whether the tree 
+        came from ASSET_TREE_CACHE instead of being built ('cache_hit') and whether the phase raised an exception ('failed')"""
+        pass
+
+
+class TqdmProgress(TreeCallback):
+    """progress bars of the phases of the tree building (see the progressbar argument of the tree pricing classes)"""
+
+    descriptions = {
+        'asset_tree': 'Building asset price tree',
+        'derivative_tree': 'Build derivative price tree',
+        'derivative_price': 'Build derivative price',
+    }
+
+    def __init__(self):
+        self.bars = {}
+
+    def on_phase_start(self, model, phase, levels):
+        self.bars[phase] = tqdm(total = levels, desc = self.descriptions.get(phase, phase))
+
+    def on_level(self, model, phase, step):
+        self.bars[phase].update()
+
+    def on_phase_end(self, model, phase, metrics):
+        self.bars.pop(phase).close()
+
+
+class MetricsRecorder(TreeCallback):
+    """records the metrics of every phase of the tree building, e.g. to be collected by a scheduler"""
+
+    def __init__(self):
+        self.records = []
+
+    def on_phase_end(self, model, phase, metrics):
+        self.records.append({ 'model': type(model).__name__, 'N': model.N, 'phase': phase, **metrics })
+
+    def to_frame(self):
+        """the records, one phase per row"""
+        return pd.DataFrame(self.records)
+
+
+class PackedTree:
+    """Full tree of prices keeping only the nodes of each level, one level after the other in a single flat array
+    (e.g. N(N+1)/2 nodes for a binomial tree with N instants, instead of the N x N of the dense tree).
+
+    Indexing follows the dense trees: tree[i] and tree[i, a:b] are views of (nodes a to b of) level i, tree[i, j] is node j of level i.
+    """
+
+    def __init__(self, level_widths: list, nodes: np.ndarray = None, dtype: type = np.float64):
+        """
+        Args:
+            level_widths (list): number of nodes of each level of the tree
+            nodes (np.ndarray, optional): flat array holding the nodes (e.g. memory-mapped). Defaults to a new array of zeros
+            dtype (type, optional): data type of a new array of nodes. Defaults to np.float64
+        """
+        widths = np.asarray(level_widths, dtype = int)
+
+        self.offsets = np.concatenate([[0], np.cumsum(widths)])
+        self.nodes = np.zeros(self.offsets[-1], dtype = dtype) if nodes is None else nodes
+
+        if self.nodes.shape != (self.offsets[-1],):
+            raise ValueError(f"Tree with {self.offsets[-1]} nodes can't be stored in an array of shape {self.nodes.shape}.")
+
+        # shape of the dense tree
+        self.shape = (len(widths), int(widths.max(initial = 0)))
+
+    @classmethod
+    def from_dense(cls, tree: np.ndarray, level_widths: list):
+        """packs a dense tree, whose level i holds level_widths[i] nodes"""
+        packed = cls(level_widths)
+        for i in range(len(packed)):
+            packed.level(i)[:] = tree[i, 0:packed.level_width(i)]
+
+        return packed
+
+    @classmethod
+    def memmap(cls, level_widths: list, path: str, dtype: type = np.float64):
+        """packed tree of zeros whose nodes are memory-mapped to the .npy file at path. The offsets of the levels
+        are saved next to it, to reopen the tree with load"""
+        offsets = np.concatenate([[0], np.cumsum(np.asarray(level_widths, dtype = int))])
+        np.save(cls._offsets_path(path), offsets)
+        nodes = np.lib.format.open_memmap(path, mode = 'w+', dtype = dtype, shape = (offsets[-1],))
+
+        return cls(level_widths, nodes = nodes)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r'):
+        """reopens a packed tree saved by memmap, without reading its nodes into memory"""
+        offsets = np.load(cls._offsets_path(path))
+        return cls(np.diff(offsets), nodes = np.load(path, mmap_mode = mmap_mode))
+
+    @staticmethod
+    def _offsets_path(path):
+        return os.path.splitext(path)[0] + '.offsets.npy'
+
+    def level(self, i: int):
+        """view of the nodes of level i"""
+        i = range(len(self))[i]
+        return self.nodes[self.offsets[i]:self.offsets[i + 1]]
+
+    def level_width(self, i: int):
+        """number of nodes of level i"""
+        return len(self.level(i))
+
+    def to_dense(self):
+        """dense tree: level i on row i, padded with zeros"""
+        dense = np.zeros(self.shape, dtype = self.nodes.dtype)
+        for i in range(len(self)):
+            dense[i, 0:self.level_width(i)] = self.level(i)
+
+        return dense
+
+    def setflags(self, write: bool = None):
+        self.nodes.setflags(write = write)
+
+    def flush(self):
+        """writes the nodes to disk, if memory-mapped"""
+        if isinstance(self.nodes, np.memmap):
+            self.nodes.flush()
+
+    @property
+    def nbytes(self):
+        return self.nodes.nbytes
+
+    def __getitem__(self, index):
+        i, j = index if isinstance(index, tuple) else (index, slice(None))
+        return self.level(i)[j]
+
+    def __setitem__(self, index, value):
+        i, j = index if isinstance(index, tuple) else (index, slice(None))
+        self.level(i)[j] = value
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype = None):
+        return self.to_dense() if dtype is None else self.to_dense().astype(dtype)
+
+
+def load_tree(path: str, mmap_mode: str = 'r'):
+    """reopens a full tree saved to disk (see the tree_dir argument of the tree pricing classes), memory-mapped:
+    nodes are only read from disk when accessed.
+
+    Args:
+        path (str): path of the .npy file of the tree, e.g. os.path.join(option.tree_path, 'derivative_price_tree.npy')
+        mmap_mode (str, optional): memory-map mode (see np.load). Defaults to read-only ('r')
+
+    Returns:
+        np.memmap or PackedTree: the dense tree or the packed tree, if saved packed
+    """
+    if os.path.exists(PackedTree._offsets_path(path)):
+        return PackedTree.load(path, mmap_mode = mmap_mode)
+
+    return np.load(path, mmap_mode = mmap_mode)
+
+
+class AssetTreeCache:
+    """Process-wide cache of asset price trees, bounded in number of trees and in bytes, with least recently used eviction.
+
+    Trees are stored read-only, since they are shared by every derivative priced on the same underlying.
+    """
+
+    def __init__(self, maxsize: int = 128, maxbytes: int = 2**30):
+        """
+        Args:
+            maxsize (int): maximum number of trees kept. Defaults to 128
+            maxbytes (int): maximum total size of the trees kept, in bytes. Trees larger than this are never cached. Defaults to 1 GiB
+        """
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._trees = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """gets the tree stored under key. If there is none, builds it by calling build() and stores it"""
+        with self._lock:
+            tree = self._trees.get(key, None)
+            if tree is not None:
+                self._trees.move_to_end(key)
+                self.hits += 1
+                return tree
+            
+            self.misses += 1
+
+        tree = build()
+        tree.setflags(write = False)
+
+        if tree.nbytes > self.maxbytes:
+            return tree
+
+        with self._lock:
+            if key not in self._trees:
+                self._trees[key] = tree
+                self._nbytes += tree.nbytes
+
+            # evict least recently used trees
+            while len(self._trees) > self.maxsize or self._nbytes > self.maxbytes:
+                _, evicted = self._trees.popitem(last = False)
+                self._nbytes -= evicted.nbytes
+
+        return tree
+
+    def clear(self):
+        """removes every tree from the cache and resets the statistics"""
+        with self._lock:
+            self._trees.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._trees)
+
+    def __contains__(self, key):
+        return key in self._trees
+
+
+ASSET_TREE_CACHE = AssetTreeCache()
 
 
 class BinomialTreePricing(ABC):
@@ -19,6 +271,17 @@ class BinomialTreePricing(ABC):
         dT: float = None,
         N: int = None,
         progressbar: bool = False,
+        vectorized: bool = True,
+        full_tree: bool = True,
+        log_space: bool = False,
+        cache: bool = True,
+        control_variate: bool = False,
+        richardson: bool = False,
+        jit: bool = True,
+        packed: bool = False,
+        tree_dir: str = None,
+        dtype: type = np.float64,
+        callbacks: list = None,
         *args, **kwargs
     ):
         """Derivatives pricing model based on Binary Trees
@@ -27,7 +290,27 @@ class BinomialTreePricing(ABC):
             T (float): expiration (units are the same period as the risk free rate. e.g. if risk-free rate is % p.a., then expiration is in years)
             dT (float): time step in the calculation
             N (float): number of instants in time in the binary tree
-            progressbar (bool): whether tho show a progress bar in building the trees or not. Defaults to not (False)
+            progressbar (bool): whether tho show a progress bar in building the trees or not (see TqdmProgress). Defaults to not (False)
+            vectorized (bool): whether to build the derivative tree one whole level at a time (True) or node by node (False). Defaults to True
+            full_tree (bool): whether to keep the full asset and derivative trees (True) or only the current level of the tree, 
+                with memory proportional to N (False). The trees are only available for inspection if True. Defaults to True
+            log_space (bool): whether to compute asset prices in log space, which stays numerically stable for large N. Defaults to False
+            cache (bool): whether to share asset price trees with other derivatives on the same underlying through ASSET_TREE_CACHE. Defaults to True
+            control_variate (bool): whether to correct the price with the european control variate, 
+                i.e. price + (closed form european price - european tree price). Defaults to False
+            richardson (bool): whether to extrapolate the price from trees with N - 1 and 2(N - 1) steps (Richardson extrapolation). Defaults to False
+            jit (bool): whether to build the trees with the compiled kernels (see kernels), when numba is installed. Only used for 
+                scalar parameters, without progress bars, by the regular binomial lattice and european or american calls and puts. Defaults to True
+            packed (bool): whether to keep the full trees packed (see PackedTree), with only the nodes of each level. 
+                Halves the memory of binomial trees. Defaults to False
+            tree_dir (str): directory in which the full trees are written to disk while they are built, as memory-mapped .npy files 
+                ('asset_price_tree.npy' and 'derivative_price_tree.npy'), so they don't need to fit in memory. Each model writes to 
+                a new subdirectory of its own (see tree_path), so models sharing tree_dir don't overwrite each other's trees. 
+                See load_tree. Defaults to none (trees in memory)
+            dtype (type): floating point type of the trees and of the levels of the backward induction. np.float32 halves memory and 
+                memory bandwidth. Rounding errors accumulate over the levels: float32 prices are within about N * 5e-8 (relative) 
+                of float64 prices, e.g. 5e-5 for N = 1000, so 1e-4 relative accuracy holds up to N = 2000. Defaults to np.float64
+            callbacks (list): subscribers to the instrumentation of the tree building (see TreeCallback), e.g. MetricsRecorder. Defaults to none
         """
 
         self = super().__new__(cls)
@@ -35,20 +318,64 @@ class BinomialTreePricing(ABC):
         self.T, self.dT, self.N = self._get_check_steps(T = T, dT = dT, N = N)
 
         self.progressbar = progressbar
+        self.vectorized = vectorized
+        self.full_tree = full_tree
+        self.log_space = log_space
+        self.cache = cache
+        self.control_variate = control_variate
+        self.richardson = richardson
+        self.jit = jit
+        self.packed = packed
+        self.tree_dir = tree_dir
+        self.dtype = np.dtype(dtype)
+        self.callbacks = list(callbacks) if callbacks is not None else []
+        self._progress = TqdmProgress()
+
+        if richardson and self.convergence_order != 1:
+            raise ValueError(f"Richardson extrapolation is only available for trees whose error is proportional to 1 / steps.")
 
         return self
 
     @property
     def price(self):
+
+        # price-only mode: no trees are kept, just the current level (and the price, so the pass runs once)
+        if not self.full_tree:
+            if getattr(self, '_price', None) is None:
+                self._price = self.build_derivative_price()
+
+            return self._price
         
         # calculation
-        # if asset price tree doesn't exist, calculate it
+        # if asset price tree doesn't exist, calculate it (or get it from another derivative on the same underlying)
         if getattr(self, 'asset_price_tree', None) is None:
-            self.asset_price_tree = self.build_asset_tree()
+            with self.instrument('asset_tree', levels = self.N) as metrics:
+                key = self._asset_tree_key() if self.cache else None
+                built = []
+
+                def build_asset_tree():
+                    built.append(True)
+                    return self.build_asset_tree()
+
+                if key is None:
+                    self.asset_price_tree = build_asset_tree()
+                else:
+                    self.asset_price_tree = ASSET_TREE_CACHE.get(key, build_asset_tree)
+
+                # trees from the cache weren't allocated by this phase
+                metrics['cache_hit'] = not built
+                metrics['bytes'] = self.asset_price_tree.nbytes if built else 0
 
         # same for derivative price tree
         if getattr(self, 'derivative_price_tree', None) is None:
-            self.derivative_price_tree = self.build_derivative_tree()
+            with self.instrument('derivative_tree', levels = self.N - 1) as metrics:
+                self.derivative_price_tree = self.build_derivative_tree()
+                metrics['bytes'] = self.derivative_price_tree.nbytes
+
+            # trees on disk
+            for tree in [self.asset_price_tree, self.derivative_price_tree]:
+                if hasattr(tree, 'flush'):
+                    tree.flush()
 
         try:
             p = self.derivative_price_tree[0, 0]
@@ -65,14 +392,212 @@ class BinomialTreePricing(ABC):
     def build_asset_tree(self):
         pass
 
+    @abstractmethod
+    def build_asset_level(self, current_step, u, d):
+        pass
+
     @abstractmethod
     def build_derivative_node(self, current_node, current_asset_node, *args, **kwargs):
         pass
+
+    @abstractmethod
+    def build_derivative_level(self, current_level, current_asset_level, current_step, early_exercise = True):
+        pass
     
     @abstractmethod
     def build_derivative_tree(self):
         pass
+
+    @abstractmethod
+    def build_derivative_price(self):
+        pass
     
+    def price_to_tolerance(self, atol: float = None, rtol: float = None, N_max: int = 100_000, agreements: int = 2):
+        """prices the derivative refining the tree until successive prices agree. Starting from N, the number 
+        of steps doubles on each refinement. Only the current level of each tree is kept (see full_tree).
+
+        Args:
+            atol (float): absolute price tolerance
+            rtol (float): relative price tolerance. At least one of atol and rtol must be present
+            N_max (int): maximum number of instants in time in the tree. Defaults to 100,000
+            agreements (int): number of successive refinements whose prices must agree. More than one guards against 
+                tree prices that oscillate and agree by chance. Defaults to 2
+
+        Returns:
+            tuple: price and the number of instants in time (N) of the tree that priced it
+        """
+        if atol is None and rtol is None:
+            raise TypeError("One of ['atol', 'rtol'] arguments must be present.")
+        
+        atol = 0 if atol is None else atol
+        rtol = 0 if rtol is None else rtol
+
+        # with Richardson extrapolation, each extrapolated price reuses the tree price of the previous refinement
+        def tree_price(dT, N):
+            return self._replace(full_tree = False, richardson = False, dT = dT, N = N).price
+        
+        N = self.N
+        raw = tree_price(dT = self.dT, N = N)
+        previous = None if self.richardson else raw
+        agreed = 0
+
+        while True:
+            # double the number of steps (the model may round N, e.g. to get an odd number of steps)
+            _, dT, N_next = self._get_refined_steps(N)
+
+            if N_next > N_max:
+                warnings.warn(
+                    f"Prices did not converge to the tolerance with up to N = {N_max}. Returning the price with N = {N}.",
+                    RuntimeWarning
+                )
+                return previous if previous is not None else raw, N
+
+            raw_next = tree_price(dT = dT, N = N_next)
+            current = 2 * raw_next - raw if self.richardson else raw_next
+            
+            if previous is not None and np.all(np.abs(current - previous) <= np.maximum(atol, rtol * np.abs(current))):
+                agreed += 1
+                if agreed >= agreements:
+                    return current, N_next
+            else:
+                agreed = 0
+
+            N, raw, previous = N_next, raw_next, current
+
+    def _get_refined_steps(self, N):
+        """T, dT and N of the tree with twice as many steps as a tree with N instants in time"""
+        return self._get_check_steps(T = self.T, dT = None, N = 2 * (N - 1) + 1)
+
+    # geometry of the tree
+    lattice = 'binomial'
+
+    # the error of the tree prices is (roughly) proportional to 1 / steps**convergence_order
+    convergence_order = 1
+
+    def build_empty_tree(self, name: str):
+        """full tree of zeros: a dense array with one level per row, or packed (see PackedTree). 
+        If tree_dir is set, the tree is memory-mapped to the file name + '.npy' in tree_path"""
+        widths = [ self.level_width(i) for i in range(self.N) ]
+
+        if self.tree_dir is None:
+            return PackedTree(widths, dtype = self.dtype) if self.packed else np.zeros((self.N, widths[-1]), dtype = self.dtype)
+
+        path = os.path.join(self.tree_path, f'{name}.npy')
+
+        if self.packed:
+            return PackedTree.memmap(widths, path, dtype = self.dtype)
+
+        # a dense tree saved earlier must not be taken as packed
+        if os.path.exists(PackedTree._offsets_path(path)):
+            os.remove(PackedTree._offsets_path(path))
+
+        return np.lib.format.open_memmap(path, mode = 'w+', dtype = self.dtype, shape = (self.N, widths[-1]))
+
+    @property
+    def tree_path(self):
+        """directory of tree_dir holding the trees of this model (created on first use). None if the trees are kept in memory"""
+        if self.tree_dir is None:
+            return None
+
+        if getattr(self, '_tree_path', None) is None:
+            os.makedirs(self.tree_dir, exist_ok = True)
+            self._tree_path = tempfile.mkdtemp(prefix = f'{type(self).__name__}_', dir = self.tree_dir)
+
+        return self._tree_path
+
+    def store_tree(self, tree: np.ndarray, name: str):
+        """copies a dense tree (e.g. built node by node) to the storage of the full trees (see build_empty_tree)"""
+        if not self.packed and self.tree_dir is None:
+            return tree.astype(self.dtype, copy = False)
+
+        stored = self.build_empty_tree(name)
+        for i in range(self.N):
+            stored[i, 0:self.level_width(i)] = tree[i, 0:self.level_width(i)]
+
+        return stored
+
+    def level_width(self, current_step):
+        """number of nodes on the level of the tree at current_step"""
+        return current_step + 1
+
+    def get_callbacks(self):
+        """subscribers to the instrumentation of the tree building: callbacks and, if progressbar, the progress bars"""
+        return self.callbacks + [self._progress] if self.progressbar else self.callbacks
+
+    @contextmanager
+    def instrument(self, phase: str, levels: int):
+        """reports a phase of the tree building (see TreeCallback) to the callbacks, timing it.
+        Yields the metrics of the phase, whose 'bytes' the phase fills in"""
+        callbacks = self.get_callbacks()
+        metrics = { 'seconds': 0., 'levels': levels, 'bytes': 0, 'steps_per_second': np.nan, 'cache_hit': False, 'failed': False }
+
+        for callback in callbacks:
+            callback.on_phase_start(model = self, phase = phase, levels = levels)
+
+        start = time.perf_counter()
+        try:
+            yield metrics
+        except BaseException:
+            metrics['failed'] = True
+            raise
+        finally:
+            metrics['seconds'] = time.perf_counter() - start
+            metrics['steps_per_second'] = levels / metrics['seconds'] if metrics['seconds'] > 0 else np.inf
+
+            for callback in callbacks:
+                callback.on_phase_end(model = self, phase = phase, metrics = metrics)
+
+    def iterate_levels(self, steps, phase: str):
+        """iterates over steps (levels of the tree), reporting each of them to the callbacks once it is built"""
+        callbacks = self.get_callbacks()
+        if not callbacks:
+            return steps
+
+        return self._report_levels(steps, phase, callbacks)
+
+    def _report_levels(self, steps, phase, callbacks):
+        for step in steps:
+            yield step
+
+            for callback in callbacks:
+                callback.on_level(model = self, phase = phase, step = step)
+
+    def _use_kernels(self, *parameters):
+        """whether the trees may be built by the compiled kernels (see kernels): numba is installed, 
+        the geometry is the regular binomial lattice and all parameters are scalars"""
+        return (
+            self.jit and kernels.NUMBA_AVAILABLE and not self.progressbar and self.lattice == 'binomial' and
+            all(np.ndim(parameter) == 0 for parameter in parameters)
+        )
+
+    def _replace(self, **attributes):
+        """shallow copy of the model, with some attributes replaced. Trees and cached results are not copied"""
+        # __new__ is bypassed: it would check the steps again
+        other = object.__new__(type(self))
+        other.__dict__.update({
+            k: v for k, v in self.__dict__.items()
+            if k not in ['asset_price_tree', 'derivative_price_tree', 'tree_head', '_price', '_bumped_prices', '_exercise_boundary', '_tree_model', '_tree_path']
+        })
+        other.__dict__.update(attributes)
+
+        return other
+
+    def _asset_tree_key(self):
+        """key identifying the asset price tree in ASSET_TREE_CACHE: spot price, number of steps and the up and down factors
+        (which hold all of the risk-free proportion inputs, for any lattice parameterization).
+        None if the tree can't be shared (e.g. array parameters or trees written to disk)"""
+        if self.tree_dir is not None:
+            return None
+
+        try:
+            u, d, _ = self.calc_riskfree_proportion()
+            return (
+                self.lattice, float(self.S0), float(u), float(d), self.N,
+                self.log_space, self.vectorized, self.packed, self.dtype.str
+            )
+        except TypeError:  # array parameters
+            return None
+
     def _get_check_steps(self, T, dT, N):
         
         # if more than one variable (out of the three ones) is None, raise TypeError
@@ -110,12 +635,219 @@ class RandomWalkRisk(ABC):
 
         return u, d, p
 
+
+class LeisenReimerRisk(RandomWalkRisk, ABC):
+    """abstract class implementing the Leisen-Reimer parameterization of the random walk. 
+    
+    Up and down factors and the risk-free proportion come from the Peizer-Pratt inversion of the Black-Scholes d1 and d2, 
+    so the tree centers on the strike and converges smoothly (order 1/N^2 for european options). The number of steps 
+    (N - 1) must be odd, so N is rounded up to the next even number.
+    """
+
+    @property
+    def convergence_order(self):
+        # early exercise brings the error of american and bermudan options back to order 1/N
+        return 2 if isinstance(self, EuropeanOption) else 1
+
+    def calc_riskfree_proportion(self):
+        steps = self.N - 1
+        sqrtT = np.sqrt(self.T)
+        d1 = (np.log(self.S0 / self.K) + (self.r - self.q + self.vol**2 / 2) * self.T) / (self.vol * sqrtT)
+        d2 = d1 - self.vol * sqrtT
+
+        # Peizer-Pratt inversion (method 2)
+        def h(z):
+            return 0.5 + np.sign(z) * np.sqrt(
+                0.25 - 0.25 * np.exp(-(z / (steps + 1/3 + 0.1 / (steps + 1)))**2 * (steps + 1/6))
+            )
+
+        p = h(d2)
+        growth = np.exp((self.r - self.q) * self.dT)
+        u = growth * h(d1) / p
+        d = (growth - p * u) / (1 - p)
+
+        return u, d, p
+
+    def _get_check_steps(self, T, dT, N):
+        T, dT, N = super()._get_check_steps(T = T, dT = dT, N = N)
+
+        # odd number of steps
+        if N % 2 == 1:
+            N += 1
+            dT = T / (N - 1)
+
+        return T, dT, N
+
+
+class SmoothedRandomWalkRisk(RandomWalkRisk, ABC):
+    """abstract class implementing a random walk whose derivative prices on the penultimate level of the tree
+    are Black-Scholes prices over the last step (binomial Black-Scholes). Smooths out the oscillation of the
+    regular tree prices around the strike.
+    """
+
+    def build_derivative_node(self, current_node, current_asset_node, current_step, proportion):
+        current_node = super().build_derivative_node(
+            current_node = current_node,
+            current_asset_node = current_asset_node,
+            current_step = current_step,
+            proportion = proportion
+        )
+
+        # on the penultimate level, the node is a level with a single node
+        if current_step == self.N - 2:
+            current_node[0, 0:1] = self.build_derivative_level(
+                current_level = current_node[0, 0:1],
+                current_asset_level = current_asset_node[0, 0:1],
+                current_step = current_step
+            )
+
+        return current_node
+
+    def build_derivative_level(self, current_level, current_asset_level, current_step, early_exercise = True):
+        if current_step == self.N - 2:
+            current_level[...] = self.closed_form_price(spot = current_asset_level, strike = self.K, T = self.dT)
+
+        return super().build_derivative_level(
+            current_level = current_level, 
+            current_asset_level = current_asset_level, 
+            current_step = current_step,
+            early_exercise = early_exercise
+        )
+
+class TrinomialTreePricing(BinomialTreePricing, ABC):
+    """Trinomial Tree pricing model for derivatives.
+    Abstract class (do not instantiate it directly)
+
+    Plugs into the same asset (Stock, Futures, Currency), exercise style (EuropeanOption, AmericanOption) and payoff (Call, Put) 
+    classes as the binary tree, replacing only the geometry of the tree: on each step the asset price goes up, stays or goes down, 
+    so the level at step i has 2i + 1 nodes. Trees are always built one level at a time.
+    """
+
+    lattice = 'trinomial'
+
+    def __new__(cls, *args, **kwargs):
+        self = super().__new__(cls, *args, **kwargs)
+
+        # there is no node by node version of the trinomial tree
+        self.vectorized = True
+
+        return self
+
+    def level_width(self, current_step):
+        return 2 * current_step + 1
+
+    def calc_riskfree_proportion(self):
+        """up and down factors, and the risk-free proportions of the up, middle and down moves"""
+        u = np.exp(self.vol * np.sqrt(2 * self.dT))
+        d = 1 / u
+
+        half_up = np.exp(self.vol * np.sqrt(self.dT / 2))
+        half_down = 1 / half_up
+        half_growth = np.exp((self.r - self.q) * self.dT / 2)
+
+        pu = ((half_growth - half_down) / (half_up - half_down))**2
+        pd = ((half_up - half_growth) / (half_up - half_down))**2
+        pm = 1 - pu - pd
+
+        return u, d, (pu, pm, pd)
+
+    def build_asset_tree(self):
+        """builds trinomial tree for any asset with a linear payoff, one whole level at a time"""
+        # calculate up and down factors
+        u, d, _ = self.calc_riskfree_proportion()
+
+        # build tree
+        tree = self.build_empty_tree('asset_price_tree')
+
+        # for each level in the tree ...
+        iterator = self.iterate_levels(range(0, self.N), phase = 'asset_tree')
+
+        for i in iterator:
+            tree[i, 0:self.level_width(i)] = self.build_asset_level(current_step = i, u = u, d = d)
+
+        return tree
+
+    def build_asset_level(self, current_step, u, d):
+        """builds a single level of the trinomial tree for any asset with a linear payoff"""
+        # node k of the level went (k - current_step) times up, net of the down moves
+        moves = np.arange(self.level_width(current_step)) - current_step
+
+        if self.log_space:
+            return np.exp(np.log(self.S0) + moves * np.log(u))
+
+        return self.S0 * u ** moves
+
+    def discount_level(self, next_level, scratch, current_step, proportion, discount):
+        pu, pm, pd = proportion
+        width = self.level_width(current_step)
+        down = next_level[..., 0:width]
+        up_middle = scratch[..., 0:width]
+
+        # up and middle prices are gathered in the scratch buffer first, because the three overlap
+        np.multiply(next_level[..., 2:width + 2], pu, out = up_middle)
+        up_middle += pm * next_level[..., 1:width + 1]
+        down *= pd
+        down += up_middle
+        down *= discount
+
+        return down
+
+    def roll_asset_level(self, next_asset_level, current_step, d):
+        # the level at current_step is the middle of the next one
+        return next_asset_level[..., 1:self.level_width(current_step) + 1]
+
+    # greeks
+    @property
+    def delta(self):
+        S1, V1 = self._get_tree_head(1)
+
+        return (V1[..., 2] - V1[..., 0]) / (S1[..., 2] - S1[..., 0])
+
+    @property
+    def gamma(self):
+        S1, V1 = self._get_tree_head(1)
+
+        delta_up = (V1[..., 2] - V1[..., 1]) / (S1[..., 2] - S1[..., 1])
+        delta_down = (V1[..., 1] - V1[..., 0]) / (S1[..., 1] - S1[..., 0])
+
+        return (delta_up - delta_down) / ((S1[..., 2] - S1[..., 0]) / 2)
+
+    @property
+    def theta(self):
+        _, V0 = self._get_tree_head(0)
+        _, V1 = self._get_tree_head(1)
+
+        return (V1[..., 1] - V0[..., 0]) / self.dT
+
 # assets
 class LinearPayoffAsset(ABC):
     """abstract class implementing any asset with a linear payoff."""
 
     def build_asset_tree(self):
-        """builds binary tree for any asset with a linear payoff"""    
+        """builds binary tree for any asset with a linear payoff, one whole level at a time"""
+        if not self.vectorized:
+            return self.build_asset_tree_nodes()
+
+        # calculate up and down factors
+        u, d, _ = self.calc_riskfree_proportion()
+
+        # build tree
+        tree = self.build_empty_tree('asset_price_tree')
+
+        if not self.packed and self._use_kernels(u, d):
+            kernels.binomial_asset_tree(np.asarray(tree), self.S0, u, d, self.log_space)
+            return tree
+
+        # for each level in the tree ...
+        iterator = self.iterate_levels(range(0, self.N), phase = 'asset_tree')
+
+        for i in iterator:
+            tree[i, 0:i + 1] = self.build_asset_level(current_step = i, u = u, d = d)
+
+        return tree
+
+    def build_asset_tree_nodes(self):
+        """builds binary tree for any asset with a linear payoff node by node. Slow, kept as a reference for the closed form version"""
         # calculate up and down factors
         u, d, _ = self.calc_riskfree_proportion()
 
@@ -125,9 +857,7 @@ class LinearPayoffAsset(ABC):
         tree = np.zeros((self.N, self.N))
 
         # for each level in the tree ...
-        iterator = range(0, self.N - 1)
-        if self.progressbar:
-            iterator = tqdm(iterator, desc = 'Building asset price tree')
+        iterator = self.iterate_levels(range(0, self.N - 1), phase = 'asset_tree')
 
         for i in iterator:
 
@@ -136,11 +866,25 @@ class LinearPayoffAsset(ABC):
                 nd = tree[i:i+2, j:j+2]
                 tree[i:i+2, j:j+2] = self.build_asset_node(current_node = nd, current_step = i, u = u, d = d)
 
-        return tree
+        return self.store_tree(tree, 'asset_price_tree')
+
+    def build_asset_level(self, current_step, u, d):
+        """builds a single level of the binary tree for any asset with a linear payoff, directly from powers of the up and down factors"""
+        # node j of the level went up j times and down (current_step - j) times
+        j = np.arange(current_step + 1)
+
+        if self.log_space:
+            return np.exp(np.log(self.S0) + j * np.log(u) + (current_step - j) * np.log(d))
+
+        return self.S0 * u ** j * d ** (current_step - j)
 
 
 class StockGeneral(LinearPayoffAsset, ABC):
     """ abstract class implementing a stock asset, paying out dividends at a rate of q """
+
+    # closed form european option pricing model of the asset
+    closed_form = BlackScholes
+
     def build_asset_node(self, current_node, current_step, u, d):
         
         # if it's the first node in the tree, S0
@@ -154,6 +898,10 @@ class StockGeneral(LinearPayoffAsset, ABC):
 
         return current_node
 
+    def _get_dividend_rate(self, r):
+        """dividend rate consistent with a risk-free rate r"""
+        return self.q
+
 
 class FuturesGeneral(StockGeneral, ABC):
     """abstract class implementing a futures contract asset.
@@ -161,10 +909,16 @@ class FuturesGeneral(StockGeneral, ABC):
     A futures contract is special because, in theory, one doesn't incur any risk by entering into a futures contract. Therefore, the total riskfree rate
     is zero. One can think of this as a composition of the riskfree rate and a dividend paying out at a rate which is the same as the riskfree rate.
     """
+
+    closed_form = Black76
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.q = self.r
 
+    def _get_dividend_rate(self, r):
+        return r
+
 
 class CurrencyGeneral(StockGeneral, ABC):
     """ abstract class implementing a currency asset. 
@@ -172,6 +926,9 @@ class CurrencyGeneral(StockGeneral, ABC):
     A currency asset is special because the total risk free rate is a composition of the riskfree rates of the pair ends
     E.g. if the currency pair is USD x ARS, then the total riskfree rate is rf_USD - rf_ARS
     """
+
+    closed_form = GarmanKohlhagen
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.rf = kwargs.get('rf', None)
@@ -225,46 +982,241 @@ class OptionGeneralPricing(ABC):
         self.vol = self._get_check_vol(vol, *args, **kwargs)
  
     def build_derivative_tree(self):
+        if not self.vectorized:
+            return self.build_derivative_tree_nodes()
+
         # calculate risk-free proportion factor
         _, _, p = self.calc_riskfree_proportion()
+        discount = np.exp(-self.r * self.dT)
 
         # build tree
         # default is price the derivative at the last level then
         # bring it to today's dollars
-        der_tree = np.zeros_like(self.asset_price_tree)
-        
-        # go one by one
-        iterator = range(self.N - 2, -1, -1)
+        der_tree = self.build_empty_tree('derivative_price_tree')
+        scratch = np.empty(der_tree.shape[1])
+
+        # state recorded by the level rules (e.g. the exercise boundary) starts over on every pass
+        self._exercise_boundary = None
 
-        if self.progressbar:
-            iterator = tqdm(iterator, desc = 'Build derivative price tree')
+        # at expiration, the derivative is worth its payoff
+        der_tree[-1] = self.option_price(spot = self.asset_price_tree[-1], strike = self.K)
+
+        rules = None if self.packed else self._get_kernel_rules(p, discount)
+        if rules is not None:
+            is_call, american = rules
+            boundary = self._get_kernel_boundary()
+            kernels.binomial_backward_induction_tree(
+                np.asarray(self.asset_price_tree), np.asarray(der_tree), p, discount, self.K, is_call, american, boundary
+            )
+            self._exercise_boundary = boundary if american else None
+            return der_tree
+
+        # go one level at a time
+        iterator = self.iterate_levels(range(self.N - 2, -1, -1), phase = 'derivative_tree')
 
         # backwards progression
         for i in iterator:
-            
-            for j in range(0, i+1):
-                asset_node = self.asset_price_tree[i:i + 2, j: j + 2]
-                der_node = der_tree[i: i + 2, j:j + 2]
+            width = self.level_width(i)
+
+            # bring from future prices to today's dollars
+            next_level = der_tree[i + 1, 0:self.level_width(i + 1)].copy()
+            level = self.discount_level(next_level = next_level, scratch = scratch, current_step = i, proportion = p, discount = discount)
+
+            der_tree[i, 0:width] = self.build_derivative_level(
+                current_level = level,
+                current_asset_level = self.asset_price_tree[i, 0:width],
+                current_step = i
+            )
 
-                der_tree[i: i + 2, j:j + 2] = self.build_derivative_node(
-                    current_node = der_node, 
-                    current_asset_node = asset_node,
-                    current_step = i,
-                    proportion = p
-                )
-                    
         return der_tree
-    
-    def _get_check_spot(self, S0, *args, **kwargs):
-        if S0 is not None:  # S0 is float-like
-            return S0
-        
-        else: # S0 is None: Meaning inputs for building portfolio must have been passed
-            base_date_raw = kwargs.get('base_date', None)
-            base_date = self._get_check_date(base_date_raw)
 
-            self.portfolio = portfolio.Portfolio(*args, **kwargs)
-            pf = self.portfolio.portfolio_total
+    def build_derivative_price(self, european_twin: bool = False):
+        """prices the derivative keeping only the current level of the tree as a 1-D buffer, overwritten in place.
+        Memory is proportional to N (instead of N x N for the full trees).
+
+        Parameters may also be arrays of shape (M, 1), in which case M derivatives are priced at once 
+        (one buffer row per derivative) and an array of M prices is returned. See price_chain
+
+        Args:
+            european_twin (bool): whether to also roll back, in the same pass, a copy of the buffer without early exercise 
+                (i.e. the european version of the derivative). If True, returns both prices. Defaults to False
+        """
+        # calculate risk-free proportion factor
+        u, d, p = self.calc_riskfree_proportion()
+        discount = np.exp(-self.r * self.dT)
+
+        # derivative prices are rolled back in dtype. Asset prices stay in float64: each level divides them by d once more,
+        # which would accumulate the rounding error of d
+        discount = np.asarray(discount, dtype = self.dtype)
+        p = tuple(np.asarray(proportion, dtype = self.dtype) for proportion in p) if isinstance(p, tuple) else np.asarray(p, dtype = self.dtype)
+
+        # at expiration, the derivative is worth its payoff.
+        # the buffer takes the shape of all parameters broadcast against the nodes (array parameters carry a length 1 node axis)
+        asset_level = self.build_asset_level(current_step = self.N - 1, u = u, d = d)
+        payoff = self.option_price(spot = asset_level, strike = self.K)
+        proportions = p if isinstance(p, tuple) else (p,)
+        shape = np.broadcast_shapes(payoff.shape, np.shape(discount), *[ np.shape(proportion) for proportion in proportions ])
+        level = np.array(np.broadcast_to(payoff, shape), dtype = self.dtype)
+
+        # the european twin is rolled back on the first row of a new leading axis
+        if european_twin:
+            level = np.stack([level, level])
+            derivative_level = level[1]
+        else:
+            derivative_level = level
+
+        scratch = np.empty_like(level)
+
+        # the first levels of the tree are kept for the greeks.
+        # state recorded by the level rules (e.g. the exercise boundary) starts over on every pass
+        self.tree_head = {}
+        self._exercise_boundary = None
+        if self.N - 1 <= 2:
+            self.tree_head[self.N - 1] = (asset_level.copy(), derivative_level.copy())
+
+        with self.instrument('derivative_price', levels = self.N - 1) as metrics:
+            metrics['bytes'] = level.nbytes + scratch.nbytes + asset_level.nbytes
+
+            # go one level at a time
+            first_step = self.N - 2
+
+            # the compiled kernels roll back the levels after the first ones, kept below for the greeks
+            rules = self._get_kernel_rules(p, discount)
+            if rules is not None and first_step > 2:
+                is_call, american = rules
+                if european_twin:
+                    kernels.binomial_backward_induction(
+                        level[0], asset_level.copy(), d, p[()], discount[()], self.K, is_call, False, first_step, 3, np.empty(self.N)
+                    )
+
+                boundary = self._get_kernel_boundary()
+                kernels.binomial_backward_induction(
+                    derivative_level, asset_level, d, p[()], discount[()], self.K, is_call, american, first_step, 3, boundary
+                )
+                self._exercise_boundary = boundary if american else None
+                first_step = 2
+
+            iterator = self.iterate_levels(range(first_step, -1, -1), phase = 'derivative_price')
+
+            # backwards progression
+            for i in iterator:
+                width = self.level_width(i)
+
+                # bring from future prices to today's dollars
+                self.discount_level(next_level = level, scratch = scratch, current_step = i, proportion = p, discount = discount)
+                asset_level = self.roll_asset_level(next_asset_level = asset_level, current_step = i, d = d)
+
+                derivative_level[..., 0:width] = self.build_derivative_level(
+                    current_level = derivative_level[..., 0:width],
+                    current_asset_level = asset_level,
+                    current_step = i
+                )
+
+                if european_twin:
+                    level[0, ..., 0:width] = self.build_derivative_level(
+                        current_level = level[0, ..., 0:width],
+                        current_asset_level = asset_level,
+                        current_step = i,
+                        early_exercise = False
+                    )
+
+                if i <= 2:
+                    self.tree_head[i] = (asset_level.copy(), derivative_level[..., 0:width].copy())
+
+        # [()] turns 0-d arrays (a single derivative) into scalars
+        if european_twin:
+            return level[1, ..., 0][()], level[0, ..., 0][()]
+
+        return level[..., 0][()]
+
+    def _get_kernel_rules(self, *parameters):
+        """payoff and exercise rules (is_call, american) of the compiled kernels (see kernels), if they price this derivative: 
+        a regular european or american call or put, with scalar parameters. None otherwise"""
+        if not self._use_kernels(self.S0, self.K, self.r, self.q, self.vol, self.T, *parameters):
+            return None
+
+        cls = type(self)
+        rules = {
+            (Call.option_price, EuropeanOption.build_derivative_level): (True, False),
+            (Put.option_price, EuropeanOption.build_derivative_level): (False, False),
+            (Call.option_price, AmericanOption.build_derivative_level): (True, True),
+            (Put.option_price, AmericanOption.build_derivative_level): (False, True),
+        }
+
+        return rules.get((cls.option_price, cls.build_derivative_level), None)
+
+    def _get_kernel_boundary(self):
+        # exercise boundary filled by the compiled kernels. At expiration, the critical price is the strike
+        boundary = np.full(self.N, np.nan)
+        boundary[self.N - 1] = self.K
+        return boundary
+
+    def discount_level(self, next_level, scratch, current_step, proportion, discount):
+        """brings the prices on the level after current_step to today's dollars, in place.
+        Returns the view of next_level holding the prices of the current level"""
+        width = self.level_width(current_step)
+        down = next_level[..., 0:width]
+        up = scratch[..., 0:width]
+
+        # up prices are copied to the scratch buffer first, because 'down' and 'up' overlap
+        np.multiply(next_level[..., 1:width + 1], proportion, out = up)
+        down *= 1 - proportion
+        down += up
+        down *= discount
+
+        return down
+
+    def roll_asset_level(self, next_asset_level, current_step, d):
+        """asset prices on the level at current_step, from the prices on the level after it (in place): 
+        each node is its down child in the next level, divided by the down factor"""
+        asset_level = next_asset_level[..., 0:self.level_width(current_step)]
+        asset_level /= d
+
+        return asset_level
+
+    def build_derivative_tree_nodes(self):
+        """builds the derivative tree node by node. Slow, kept as a reference for the level-vectorized version"""
+        # calculate risk-free proportion factor
+        _, _, p = self.calc_riskfree_proportion()
+
+        # build tree
+        # default is price the derivative at the last level then
+        # bring it to today's dollars
+        asset_tree = np.asarray(self.asset_price_tree)
+        der_tree = np.zeros_like(asset_tree)
+        
+        # go one by one
+        iterator = self.iterate_levels(range(self.N - 2, -1, -1), phase = 'derivative_tree')
+
+        # backwards progression
+        for i in iterator:
+            
+            for j in range(0, i+1):
+                asset_node = asset_tree[i:i + 2, j: j + 2]
+                der_node = der_tree[i: i + 2, j:j + 2]
+
+                der_tree[i: i + 2, j:j + 2] = self.build_derivative_node(
+                    current_node = der_node, 
+                    current_asset_node = asset_node,
+                    current_step = i,
+                    proportion = p
+                )
+                    
+        # the node by node tree doesn't record the exercise boundary
+        self._exercise_boundary = None
+
+        return self.store_tree(der_tree, 'derivative_price_tree')
+    
+    def _get_check_spot(self, S0, *args, **kwargs):
+        if S0 is not None:  # S0 is float-like
+            return S0
+        
+        else: # S0 is None: Meaning inputs for building portfolio must have been passed
+            base_date_raw = kwargs.get('base_date', None)
+            base_date = self._get_check_date(base_date_raw)
+
+            self.portfolio = portfolio.Portfolio(*args, **kwargs)
+            pf = self.portfolio.portfolio_total
 
             if base_date is None:  # if base_date doesn't exist, get last entry from portfolio total
                 return pf.iloc[-1]
@@ -274,7 +1226,7 @@ class OptionGeneralPricing(ABC):
     def _get_check_vol(self, vol, *args, **kwargs):
 
         if vol is not None:
-            if vol < 0:
+            if np.any(np.asarray(vol) < 0):
                 raise ValueError(f"Volatility must be non-negative.")
         
         else: # vol is None. Meaning parameters were passed to create a vol model directly
@@ -308,16 +1260,327 @@ class Option(OptionGeneralPricing, BinomialTreePricing, ABC):
         
         return s
 
+    @property
+    def price(self):
+
+        # Richardson extrapolation: the error of the tree price is (roughly) proportional to 1 / steps,
+        # so 2 x price(2 x steps) - price(steps) cancels it out
+        if not (self.richardson or self.control_variate):
+            return super().price
+
+        # both are priced once, on trees of the model itself (shared with the greeks, see _get_tree_model)
+        if getattr(self, '_price', None) is not None:
+            return self._price
+
+        if self.richardson:
+            _, dT, N = self._get_check_steps(T = self.T, dT = None, N = 2 * (self.N - 1) + 1)
+            coarse = self._replace(richardson = False, full_tree = False, _tree_model = self._get_tree_model())
+            fine = self._replace(richardson = False, full_tree = False, N = N, dT = dT)
+
+            self._price = 2 * fine.price - (coarse.price if self.control_variate else coarse._tree_model.price)
+
+        # european control variate: the error of the tree on the european option (for which there is a closed form)
+        # is a good estimate of the error on this option. Both are priced on a single backward induction
+        else:
+            model = self._get_tree_model()
+            model._price, price_european = model.build_derivative_price(european_twin = True)
+            price_closed_form = self.closed_form_price(spot = self.S0, strike = self.K, T = self.T)
+
+            # drop the node axis of array parameters, as the price does
+            self._price = model._price + (np.atleast_1d(price_closed_form)[..., 0][()] - price_european)
+
+        return self._price
+
+    def _get_tree_model(self):
+        """price-only copy of the model, without Richardson extrapolation nor control variates: the tree of the model itself"""
+        if getattr(self, '_tree_model', None) is None:
+            self._tree_model = self._replace(richardson = False, control_variate = False, full_tree = False)
+
+        return self._tree_model
+
+    # greeks
+    # bump sizes for the greeks that can't be read from the tree
+    vol_bump = 1e-3
+    rate_bump = 1e-4
+
+    @property
+    def delta(self):
+        """sensitivity of the option price to the spot price, from the first level of the tree"""
+        S1, V1 = self._get_tree_head(1)
+
+        return (V1[..., 1] - V1[..., 0]) / (S1[..., 1] - S1[..., 0])
+
+    @property
+    def gamma(self):
+        """sensitivity of delta to the spot price, from the second level of the tree"""
+        S2, V2 = self._get_tree_head(2)
+
+        delta_up = (V2[..., 2] - V2[..., 1]) / (S2[..., 2] - S2[..., 1])
+        delta_down = (V2[..., 1] - V2[..., 0]) / (S2[..., 1] - S2[..., 0])
+
+        return (delta_up - delta_down) / ((S2[..., 2] - S2[..., 0]) / 2)
+
+    @property
+    def theta(self):
+        """sensitivity of the option price to the passage of time (per unit of time), from the root and the middle node of the second level of the tree"""
+        _, V0 = self._get_tree_head(0)
+        _, V2 = self._get_tree_head(2)
+
+        return (V2[..., 1] - V0[..., 0]) / (2 * self.dT)
+
+    @property
+    def vega(self):
+        """sensitivity of the option price to the volatility (per unit of volatility), by central differences"""
+        prices = self._get_bumped_prices()
+
+        return (prices[0] - prices[1]) / (2 * self.vol_bump)
+
+    @property
+    def rho(self):
+        """sensitivity of the option price to the risk-free rate (per unit of rate), by central differences"""
+        prices = self._get_bumped_prices()
+
+        return (prices[2] - prices[3]) / (2 * self.rate_bump)
+
+    def _get_tree_head(self, level):
+        """asset and derivative prices on one of the first levels (0, 1 or 2) of the tree"""
+        if self.N < 3:
+            raise ValueError(f"Greeks need a tree with at least 3 instants in time. Got N = {self.N}.")
+        
+        # extrapolated prices and control variates aren't read from a single tree: use the tree of the model itself
+        if self.richardson or self.control_variate:
+            return self._get_tree_model()._get_tree_head(level)
+
+        # reuse the tree head of the price-only pass
+        if not self.full_tree and getattr(self, 'tree_head', None) is not None:
+            return self.tree_head[level]
+
+        # make sure the tree was built
+        _ = self.price
+
+        if self.full_tree:
+            width = self.level_width(level)
+            return self.asset_price_tree[level, 0:width], self.derivative_price_tree[level, 0:width]
+        
+        return self.tree_head[level]
+
+    def _get_bumped_prices(self):
+        """prices with bumped volatility (up, down) and risk-free rate (up, down), priced together in a single backward induction"""
+        if getattr(self, '_bumped_prices', None) is None:
+            # scenarios are stacked on a new leading axis, in front of the shape of all parameters
+            # (scalars get the length 1 node axis that array parameters already have)
+            shape = np.broadcast_shapes(*[ np.shape(x) for x in [self.S0, self.K, self.vol, self.r, self.q, self.dT] ], (1,))
+            vol = np.broadcast_to(np.asarray(self.vol, dtype = float), shape)
+            r = np.broadcast_to(np.asarray(self.r, dtype = float), shape)
+            hv, hr = self.vol_bump, self.rate_bump
+
+            # one scenario per row: vol up, vol down, rate up, rate down
+            bumped = self._replace(
+                full_tree = False,
+                progressbar = False,
+                vol = np.stack([vol + hv, vol - hv, vol, vol]),
+                r = np.stack([r, r, r + hr, r - hr]),
+            )
+            bumped.q = bumped._get_dividend_rate(bumped.r)
+
+            self._bumped_prices = bumped.price
+
+        return self._bumped_prices
+
 class Call(ABC):
     """abstract class implementing the pricing rule for a call option"""
     def option_price(self, spot, strike):
-        return max(spot - strike, 0)
+        return np.maximum(spot - strike, 0)
+
+    def closed_form_price(self, spot, strike, T):
+        """european price with time T to expiration, from the closed form model of the asset (e.g. Black-Scholes)"""
+        return self.closed_form(S0 = spot, K = strike, r = self.r, T = T, vol = self.vol, q = self.q).call
+
+    def critical_price(self, spot, exercise):
+        """lowest spot price (last axis) on which the option is exercised. NaN if it isn't exercised at all"""
+        critical = np.min(np.where(exercise, spot, np.inf), axis = -1)
+        return np.where(np.isinf(critical), np.nan, critical)
+
+    def in_exercise_region(self, spot, critical):
+        return spot >= critical
 
 
 class Put(ABC):
     """abstract class implementing the pricing rule for a put option"""
     def option_price(self, spot, strike):
-        return max(strike - spot, 0)
+        return np.maximum(strike - spot, 0)
+
+    def closed_form_price(self, spot, strike, T):
+        """european price with time T to expiration, from the closed form model of the asset (e.g. Black-Scholes)"""
+        return self.closed_form(S0 = spot, K = strike, r = self.r, T = T, vol = self.vol, q = self.q).put
+
+    def critical_price(self, spot, exercise):
+        """highest spot price (last axis) on which the option is exercised. NaN if it isn't exercised at all"""
+        critical = np.max(np.where(exercise, spot, -np.inf), axis = -1)
+        return np.where(np.isinf(critical), np.nan, critical)
+
+    def in_exercise_region(self, spot, critical):
+        return spot <= critical
+
+
+class BarrierOption(ABC):
+    """abstract class implementing a barrier on an option payoff: the option is knocked in or out once the asset price 
+    reaches the barrier. The barrier is monitored on every step of the tree, as a mask over each level.
+    
+    The barrier rules wrap the exercise rules, so barriers come before the exercise style in the class bases, e.g.
+    (Stock, UpAndOutBarrier, EuropeanOption, Call)
+    """
+
+    # 'up' (barrier above the spot price) or 'down' (barrier below the spot price)
+    barrier_direction = None
+
+    def __init__(self, *args, barrier: float = None, align_barrier: bool = True, **kwargs):
+        """
+        Args:
+            barrier (float): asset price at which the option is knocked in or out. Defaults to none (never reached)
+            align_barrier (bool): whether to choose the number of steps (at least N) so that a level of nodes lies just 
+                beyond the barrier. Removes most of the sawtooth error of barriers placed between nodes, so a small N suffices. 
+                Only for scalar parameters and lattices whose log spacing is proportional to sqrt(dT), such as the default 
+                binomial lattice. Defaults to True
+        """
+        super().__init__(*args, **kwargs)
+
+        self.barrier = barrier
+
+        if self.control_variate:
+            raise ValueError("Control variates are not available for barrier options.")
+
+        if self.richardson:
+            raise ValueError("Richardson extrapolation is not available for barrier options.")
+
+        self.align_barrier = (
+            align_barrier and barrier is not None and all(np.ndim(var) == 0 for var in [self.S0, self.vol, self.T, barrier])
+        )
+        if self.align_barrier:
+            self.T, self.dT, self.N = self._get_check_steps(T = self.T, dT = None, N = self._get_barrier_steps())
+
+    def knocked(self, spot):
+        """mask of the asset prices which reach the barrier"""
+        if self.barrier is None:
+            return np.zeros(np.shape(spot), dtype = bool)
+
+        if self.barrier_direction == 'up':
+            return spot >= self.barrier
+        
+        return spot <= self.barrier
+
+    @abstractmethod
+    def apply_barrier(self, current_level, current_asset_level, current_step):
+        pass
+
+    def build_derivative_level(self, current_level, current_asset_level, current_step, early_exercise = True):
+        current_level = super().build_derivative_level(
+            current_level = current_level, 
+            current_asset_level = current_asset_level, 
+            current_step = current_step,
+            early_exercise = early_exercise
+        )
+
+        return self.apply_barrier(current_level = current_level, current_asset_level = current_asset_level, current_step = current_step)
+
+    def build_derivative_node(self, current_node, current_asset_node, current_step, proportion):
+        current_node = super().build_derivative_node(
+            current_node = current_node,
+            current_asset_node = current_asset_node,
+            current_step = current_step,
+            proportion = proportion
+        )
+
+        # the node is a level with a single node
+        current_node[0, 0:1] = self.apply_barrier(
+            current_level = current_node[0, 0:1],
+            current_asset_level = current_asset_node[0, 0:1],
+            current_step = current_step
+        )
+
+        return current_node
+
+    def _get_barrier_steps(self):
+        # log distance between levels of nodes, at the current number of steps
+        u, _, _ = self.calc_riskfree_proportion()
+        spacing = np.log(u)
+        distance = np.abs(np.log(self.barrier / self.S0))
+
+        # already on the barrier: nothing to align
+        levels = int(np.ceil(distance / spacing))
+        if levels == 0:
+            return self.N
+
+        # the spacing is proportional to 1 / sqrt(steps). Choose the largest number of steps for which 
+        # the barrier lies at or just before the first level of nodes beyond it (Boyle & Lau)
+        steps = int(np.floor(levels**2 * spacing**2 * (self.N - 1) / distance**2))
+
+        return steps + 1
+
+    def _get_refined_steps(self, N):
+        # refined trees are aligned to the barrier as well
+        T, dT, N = super()._get_refined_steps(N)
+        if not self.align_barrier:
+            return T, dT, N
+
+        return self._get_check_steps(T = T, dT = None, N = self._replace(T = T, dT = dT, N = N)._get_barrier_steps())
+
+    def __str__(self):
+        if self.barrier is None:
+            return f' ({self.barrier_direction}-and-{self.knock} barrier never reached)' + super().__str__()
+
+        return f' ({self.barrier_direction}-and-{self.knock} barrier at $ {self.barrier:.3f})' + super().__str__()
+
+
+class KnockOutBarrier(BarrierOption, ABC):
+    """abstract class implementing a knock-out barrier: the option is worth nothing once the barrier is reached"""
+    knock = 'out'
+
+    def option_price(self, spot, strike):
+        return np.where(self.knocked(spot), 0, super().option_price(spot = spot, strike = strike))
+
+    def apply_barrier(self, current_level, current_asset_level, current_step):
+        return np.where(self.knocked(current_asset_level), 0, current_level)
+
+
+class KnockInBarrier(BarrierOption, ABC):
+    """abstract class implementing a knock-in barrier: the option only comes into existence once the barrier is reached.
+    On the nodes beyond the barrier, it is worth the regular european option (closed form price), so 
+    only european options are available"""
+    knock = 'in'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        if isinstance(self, AmericanOption):
+            raise TypeError("Knock-in barriers are only available for european options.")
+
+    def option_price(self, spot, strike):
+        return np.where(self.knocked(spot), super().option_price(spot = spot, strike = strike), 0)
+
+    def apply_barrier(self, current_level, current_asset_level, current_step):
+        knocked = self.knocked(current_asset_level)
+        if not np.any(knocked):
+            return current_level
+
+        vanilla = self.closed_form_price(spot = current_asset_level, strike = self.K, T = self.T - current_step * self.dT)
+        return np.where(knocked, vanilla, current_level)
+
+
+class UpAndOutBarrier(KnockOutBarrier, ABC):
+    barrier_direction = 'up'
+
+
+class DownAndOutBarrier(KnockOutBarrier, ABC):
+    barrier_direction = 'down'
+
+
+class UpAndInBarrier(KnockInBarrier, ABC):
+    barrier_direction = 'up'
+
+
+class DownAndInBarrier(KnockInBarrier, ABC):
+    barrier_direction = 'down'
 
 
 class EuropeanOption(Option, ABC):
@@ -338,6 +1601,10 @@ class EuropeanOption(Option, ABC):
         )
     
         return current_node
+
+    def build_derivative_level(self, current_level, current_asset_level, current_step, early_exercise = True):
+        # only exercised at expiration: the level is just the discounted expectation
+        return current_level
     
     def __str__(self):
         return ' (european style)' + super().__str__()
@@ -357,23 +1624,139 @@ class AmericanOption(Option, ABC):
         down, up = current_node[1, :]
         
         # this is the price if we kept the option
-        keep = np.exp(-self.r * self.dT) * (
+        current_node[0, 0] = np.exp(-self.r * self.dT) * (
             proportion * up + (1 - proportion) * down
         )
 
-        # this is the price for which we'd be able to sell the option
-        # at the current_time
-        Stnow = current_asset_node[0, 0]
-        sell = self.option_price(spot = Stnow, strike = self.K)
-
-        current_node[0, 0] = max(keep, sell)
+        # the early exercise rule (price for which we'd be able to sell the option at the current time)
+        # is the same as the level's, seen as a level with a single node
+        current_node[0, 0:1] = self.build_derivative_level(
+            current_level = current_node[0, 0:1],
+            current_asset_level = current_asset_node[0, 0:1],
+            current_step = current_step
+        )
     
         return current_node
 
+    def build_derivative_level(self, current_level, current_asset_level, current_step, early_exercise = True):
+        # early_exercise may also be an array, masking the derivatives (leading axes) that can be exercised on this level
+        if not np.any(early_exercise):
+            return current_level
+
+        # for each node, the price if we kept the option (current_level) or
+        # the price for which we'd be able to sell it at the current time
+        sell = self.option_price(spot = current_asset_level, strike = self.K)
+        exercise = (sell > current_level) & (sell > 0) & np.expand_dims(early_exercise, axis = -1)
+
+        # record the critical asset price at which exercising beats keeping the option.
+        # at expiration, the critical price is the strike
+        if getattr(self, '_exercise_boundary', None) is None:
+            shape = np.broadcast_shapes(np.shape(current_level), np.shape(self.K))
+            self._exercise_boundary = np.full(shape[:-1] + (self.N,), np.nan)
+            self._exercise_boundary[..., self.N - 1] = np.broadcast_to(self.K, shape)[..., 0]
+
+        self._exercise_boundary[..., current_step] = self.critical_price(spot = current_asset_level, exercise = exercise)
+
+        return np.where(exercise, sell, current_level)
+
+    @property
+    def exercise_boundary(self):
+        """critical asset price on each step of the tree (array index is the step): the option is exercised at or below it (put) 
+        or at or above it (call). NaN on the steps on which exercising is never optimal"""
+        if getattr(self, '_exercise_boundary', None) is None:
+            _ = self.price
+
+        # priced on copies of the model (e.g. Richardson extrapolation) or node by node
+        if getattr(self, '_exercise_boundary', None) is None:
+            model = self._get_tree_model()
+            price = model.price
+            self._exercise_boundary = model._exercise_boundary
+
+        # never exercised before expiration
+        if self._exercise_boundary is None:
+            self._exercise_boundary = np.full(np.shape(price) + (self.N,), np.nan)
+            self._exercise_boundary[..., self.N - 1] = np.broadcast_to(self.K, np.shape(price) + (1,))[..., 0]
+
+        return self._exercise_boundary
+
+    def reprice(self, spot):
+        """approximate price after a (small) move of the spot price, without rebuilding the tree.
+
+        Spot prices in the exercise region (see exercise_boundary, on the earliest step on which it is known) are worth 
+        their intrinsic value. Otherwise, the continuation value is interpolated from the tree (second order, with delta and gamma).
+        """
+        boundary = self.exercise_boundary
+        known = ~np.isnan(boundary)
+        critical = np.where(
+            known.any(axis = -1),
+            np.take_along_axis(boundary, np.argmax(known, axis = -1)[..., np.newaxis], axis = -1)[..., 0],
+            np.nan
+        )
+
+        intrinsic = self.option_price(spot = spot, strike = np.squeeze(self.K, axis = -1) if np.ndim(self.K) else self.K)
+        dS = spot - (np.squeeze(self.S0, axis = -1) if np.ndim(self.S0) else self.S0)
+        continuation = self.price + self.delta * dS + self.gamma * dS**2 / 2
+
+        return np.where(
+            self.in_exercise_region(spot = spot, critical = critical),
+            intrinsic,
+            np.maximum(continuation, intrinsic)
+        )
+
     def __str__(self):
         return ' (american style)' + super().__str__()
 
 
+class BermudanOption(AmericanOption, ABC):
+    """ abstract class implementing a bermudan option, i.e. one may exercise it on a set of dates until the expiration.
+    Each exercise date is mapped onto the closest step of the tree, on which the early exercise rule of an american option applies"""
+
+    def __init__(self, *args, exercise_dates: list = None, **kwargs):
+        """
+        Args:
+            exercise_dates (list): dates on which the option may be exercised before the expiration. Accepts times from t0 
+                (floats, same unit as the expiration) or dates (str, dt.date or dt.datetime, in which case base_date must be set
+                and times are in years, on a 365 days basis). Defaults to none (exercise only at expiration)
+        """
+        super().__init__(*args, **kwargs)
+
+        self.exercise_times = self._get_check_exercise_dates(exercise_dates, kwargs.get('base_date', None))
+
+    @property
+    def exercise_steps(self):
+        """steps of the tree on which the option may be exercised before the expiration"""
+        steps = np.rint(self.exercise_times / np.asarray(self.dT, dtype = float))
+        return np.clip(steps, 0, self.N - 1).astype(int)
+
+    def build_derivative_level(self, current_level, current_asset_level, current_step, early_exercise = True):
+        # the early exercise rule only applies on the exercise steps of each derivative (last axis of exercise_steps)
+        exercisable = np.logical_and(early_exercise, np.any(self.exercise_steps == current_step, axis = -1))
+
+        return super().build_derivative_level(
+            current_level = current_level, 
+            current_asset_level = current_asset_level, 
+            current_step = current_step,
+            early_exercise = exercisable
+        )
+
+    def _get_check_exercise_dates(self, exercise_dates, base_date_raw):
+        if exercise_dates is None:
+            return np.array([])
+        
+        exercise_dates = list(exercise_dates)
+        if any(isinstance(date, (str, dt.date)) for date in exercise_dates):
+            base_date = self._get_check_date(base_date_raw)
+            if base_date is None:
+                raise TypeError("Argument 'base_date' must be set for exercise dates given as dates.")
+
+            exercise_dates = [ (self._get_check_date(date) - base_date).days / 365 for date in exercise_dates ]
+
+        return np.array(exercise_dates, dtype = float)
+
+    def __str__(self):
+        return super().__str__().replace(' (american style)', ' (bermudan style)')
+
+
 ## from now on, all classes are concrete classe (instantiable classes)
 # stock options
 class EuropeanCallStockOption(Stock, EuropeanOption, Call):
@@ -423,6 +1806,245 @@ class AmericanPutCurrencyOption(Currency, AmericanOption, Put):
         return s
 
 
+# futures options
+class EuropeanCallFuturesOption(Futures, EuropeanOption, Call):
+    def __str__(self):
+        s = f'Call Futures Option' + super().__str__()
+        return s
+
+
+class EuropeanPutFuturesOption(Futures, EuropeanOption, Put):
+    def __str__(self):
+        s = f'Put Futures Option' + super().__str__()
+        return s
+
+
+class AmericanCallFuturesOption(Futures, AmericanOption, Call):
+    def __str__(self):
+        s = f'Call Futures Option' + super().__str__()
+        return s
+
+
+class AmericanPutFuturesOption(Futures, AmericanOption, Put):
+    def __str__(self):
+        s = f'Put Futures Option' + super().__str__()
+        return s
+
+
+# bermudan options
+class BermudanCallStockOption(Stock, BermudanOption, Call):
+    def __str__(self):
+        s = f'Call Stock Option' + super().__str__()
+        return s
+
+
+class BermudanPutStockOption(Stock, BermudanOption, Put):
+    def __str__(self):
+        s = f'Put Stock Option' + super().__str__()
+        return s
+
+
+class BermudanCallCurrencyOption(Currency, BermudanOption, Call):
+    def __str__(self):
+        s = f'Call Currency Option' + super().__str__()
+        return s
+
+
+class BermudanPutCurrencyOption(Currency, BermudanOption, Put):
+    def __str__(self):
+        s = f'Put Currency Option' + super().__str__()
+        return s
+
+
+# barrier options
+class EuropeanUpAndOutCallStockOption(Stock, UpAndOutBarrier, EuropeanOption, Call):
+    def __str__(self):
+        s = f'Call Stock Option' + super().__str__()
+        return s
+
+
+class EuropeanUpAndOutPutStockOption(Stock, UpAndOutBarrier, EuropeanOption, Put):
+    def __str__(self):
+        s = f'Put Stock Option' + super().__str__()
+        return s
+
+
+class EuropeanUpAndInCallStockOption(Stock, UpAndInBarrier, EuropeanOption, Call):
+    def __str__(self):
+        s = f'Call Stock Option' + super().__str__()
+        return s
+
+
+class EuropeanUpAndInPutStockOption(Stock, UpAndInBarrier, EuropeanOption, Put):
+    def __str__(self):
+        s = f'Put Stock Option' + super().__str__()
+        return s
+
+
+class EuropeanDownAndOutCallStockOption(Stock, DownAndOutBarrier, EuropeanOption, Call):
+    def __str__(self):
+        s = f'Call Stock Option' + super().__str__()
+        return s
+
+
+class EuropeanDownAndOutPutStockOption(Stock, DownAndOutBarrier, EuropeanOption, Put):
+    def __str__(self):
+        s = f'Put Stock Option' + super().__str__()
+        return s
+
+
+class EuropeanDownAndInCallStockOption(Stock, DownAndInBarrier, EuropeanOption, Call):
+    def __str__(self):
+        s = f'Call Stock Option' + super().__str__()
+        return s
+
+
+class EuropeanDownAndInPutStockOption(Stock, DownAndInBarrier, EuropeanOption, Put):
+    def __str__(self):
+        s = f'Put Stock Option' + super().__str__()
+        return s
+
+
+class AmericanUpAndOutCallStockOption(Stock, UpAndOutBarrier, AmericanOption, Call):
+    def __str__(self):
+        s = f'Call Stock Option' + super().__str__()
+        return s
+
+
+class AmericanUpAndOutPutStockOption(Stock, UpAndOutBarrier, AmericanOption, Put):
+    def __str__(self):
+        s = f'Put Stock Option' + super().__str__()
+        return s
+
+
+class AmericanDownAndOutCallStockOption(Stock, DownAndOutBarrier, AmericanOption, Call):
+    def __str__(self):
+        s = f'Call Stock Option' + super().__str__()
+        return s
+
+
+class AmericanDownAndOutPutStockOption(Stock, DownAndOutBarrier, AmericanOption, Put):
+    def __str__(self):
+        s = f'Put Stock Option' + super().__str__()
+        return s
+
+
+# alternative lattice parameterizations
+# Leisen-Reimer
+class EuropeanCallStockOptionLR(LeisenReimerRisk, EuropeanCallStockOption):
+    pass
+
+
+class EuropeanPutStockOptionLR(LeisenReimerRisk, EuropeanPutStockOption):
+    pass
+
+
+class AmericanCallStockOptionLR(LeisenReimerRisk, AmericanCallStockOption):
+    pass
+
+
+class AmericanPutStockOptionLR(LeisenReimerRisk, AmericanPutStockOption):
+    pass
+
+
+class EuropeanCallCurrencyOptionLR(LeisenReimerRisk, EuropeanCallCurrencyOption):
+    pass
+
+
+class EuropeanPutCurrencyOptionLR(LeisenReimerRisk, EuropeanPutCurrencyOption):
+    pass
+
+
+class AmericanCallCurrencyOptionLR(LeisenReimerRisk, AmericanCallCurrencyOption):
+    pass
+
+
+class AmericanPutCurrencyOptionLR(LeisenReimerRisk, AmericanPutCurrencyOption):
+    pass
+
+
+# smoothed (Black-Scholes on the penultimate level)
+class EuropeanCallStockOptionSmoothed(SmoothedRandomWalkRisk, EuropeanCallStockOption):
+    pass
+
+
+class EuropeanPutStockOptionSmoothed(SmoothedRandomWalkRisk, EuropeanPutStockOption):
+    pass
+
+
+class AmericanCallStockOptionSmoothed(SmoothedRandomWalkRisk, AmericanCallStockOption):
+    pass
+
+
+class AmericanPutStockOptionSmoothed(SmoothedRandomWalkRisk, AmericanPutStockOption):
+    pass
+
+
+class EuropeanCallCurrencyOptionSmoothed(SmoothedRandomWalkRisk, EuropeanCallCurrencyOption):
+    pass
+
+
+class EuropeanPutCurrencyOptionSmoothed(SmoothedRandomWalkRisk, EuropeanPutCurrencyOption):
+    pass
+
+
+class AmericanCallCurrencyOptionSmoothed(SmoothedRandomWalkRisk, AmericanCallCurrencyOption):
+    pass
+
+
+class AmericanPutCurrencyOptionSmoothed(SmoothedRandomWalkRisk, AmericanPutCurrencyOption):
+    pass
+
+
+# trinomial trees
+class EuropeanCallStockOptionTrinomial(TrinomialTreePricing, Stock, EuropeanOption, Call):
+    def __str__(self):
+        s = f'Call Stock Option' + super().__str__()
+        return s.replace('Binary Tree', 'Trinomial Tree')
+
+
+class EuropeanPutStockOptionTrinomial(TrinomialTreePricing, Stock, EuropeanOption, Put):
+    def __str__(self):
+        s = f'Put Stock Option' + super().__str__()
+        return s.replace('Binary Tree', 'Trinomial Tree')
+
+
+class AmericanCallStockOptionTrinomial(TrinomialTreePricing, Stock, AmericanOption, Call):
+    def __str__(self):
+        s = f'Call Stock Option' + super().__str__()
+        return s.replace('Binary Tree', 'Trinomial Tree')
+
+
+class AmericanPutStockOptionTrinomial(TrinomialTreePricing, Stock, AmericanOption, Put):
+    def __str__(self):
+        s = f'Put Stock Option' + super().__str__()
+        return s.replace('Binary Tree', 'Trinomial Tree')
+
+
+class EuropeanCallCurrencyOptionTrinomial(TrinomialTreePricing, Currency, EuropeanOption, Call):
+    def __str__(self):
+        s = f'Call Currency Option' + super().__str__()
+        return s.replace('Binary Tree', 'Trinomial Tree')
+
+
+class EuropeanPutCurrencyOptionTrinomial(TrinomialTreePricing, Currency, EuropeanOption, Put):
+    def __str__(self):
+        s = f'Put Currency Option' + super().__str__()
+        return s.replace('Binary Tree', 'Trinomial Tree')
+
+
+class AmericanCallCurrencyOptionTrinomial(TrinomialTreePricing, Currency, AmericanOption, Call):
+    def __str__(self):
+        s = f'Call Currency Option' + super().__str__()
+        return s.replace('Binary Tree', 'Trinomial Tree')
+
+
+class AmericanPutCurrencyOptionTrinomial(TrinomialTreePricing, Currency, AmericanOption, Put):
+    def __str__(self):
+        s = f'Put Currency Option' + super().__str__()
+        return s.replace('Binary Tree', 'Trinomial Tree')
+
+
 BUILDINGBLOCKS = { 
     dermodel for dermodel in locals().values() 
     if (
@@ -439,4 +2061,318 @@ MODELS = {
         ABC not in getattr(dermodel, '__bases__', set()) and   # class does not inherit directly from ABC
         dermodel != ABC                                        # class isn't ABC
    )
-}
\ No newline at end of file
+}
+
+# option chains
+CHAIN_MODELS = {
+    ('call', 'european'): EuropeanCallStockOption,
+    ('put', 'european'): EuropeanPutStockOption,
+    ('call', 'american'): AmericanCallStockOption,
+    ('put', 'american'): AmericanPutStockOption,
+}
+
+def price_chain(
+    S0: float or np.ndarray,
+    K: float or np.ndarray,
+    T: float or np.ndarray,
+    vol: float or np.ndarray,
+    r: float or np.ndarray,
+    q: float or np.ndarray = 0,
+    option_type: str or np.ndarray = 'call',
+    exercise: str or np.ndarray = 'european',
+    N: int = 200,
+    **kwargs
+):
+    """Prices a whole chain of options at once, with broadcast lattice operations.
+
+    All contracts sharing option type and exercise style are priced together, in a single backward
+    induction over (contracts x nodes) levels. Futures and currency options are priced by passing q = r
+    and q = rf, respectively.
+
+    Args:
+        S0 (float or array): underlying asset spot price at t0
+        K (float or array): strike
+        T (float or array): expiration (units are the same period as the risk free rate)
+        vol (float or array): volatility
+        r (float or array): risk-free rate
+        q (float or array, optional): rate at which the underlying asset pays out dividends. Defaults to 0.
+        option_type (str or array, optional): 'call' or 'put'. Defaults to 'call'
+        exercise (str or array, optional): 'european' or 'american'. Defaults to 'european'
+        N (int, optional): number of instants in time in every binary tree. Defaults to 200
+        all other keyword arguments are passed on to the tree pricing classes (e.g. dtype = np.float32)
+
+    Returns:
+        np.ndarray: prices, with the broadcast shape of the inputs, in the input order
+    """
+    S0, K, T, vol, r, q, option_type, exercise = np.broadcast_arrays(
+        S0, K, T, vol, r, q, option_type, exercise
+    )
+    shape = S0.shape
+
+    option_type = np.char.lower(option_type.astype(str).ravel())
+    exercise = np.char.lower(exercise.astype(str).ravel())
+
+    unknown = ~np.isin(option_type, ['call', 'put']) | ~np.isin(exercise, ['european', 'american'])
+    if unknown.any():
+        raise ValueError(
+            f"Option type must be 'call' or 'put' and exercise must be 'european' or 'american'. "
+            f"Got {option_type[unknown][0]!r} and {exercise[unknown][0]!r}."
+        )
+
+    prices = np.full(option_type.shape, np.nan)
+
+    for (opt_type, ex), model in CHAIN_MODELS.items():
+        idx = np.flatnonzero((option_type == opt_type) & (exercise == ex))
+        if idx.size == 0:
+            continue
+
+        # one row per contract, so that parameters broadcast against the nodes of each level
+        params = {
+            name: np.asarray(param, dtype = float).ravel()[idx, np.newaxis]
+            for name, param in dict(S0 = S0, K = K, T = T, vol = vol, r = r, q = q).items()
+        }
+
+        option = model(N = N, full_tree = False, **params, **kwargs)
+        prices[idx] = option.price
+
+    return prices.reshape(shape)
+
+
+def implied_vol_chain(
+    price: float or np.ndarray,
+    S0: float or np.ndarray,
+    K: float or np.ndarray,
+    T: float or np.ndarray,
+    r: float or np.ndarray,
+    q: float or np.ndarray = 0,
+    option_type: str or np.ndarray = 'call',
+    exercise: str or np.ndarray = 'american',
+    N: int = 200,
+    tol: float = 1e-6,
+    max_iter: int = 50,
+    vol_bounds: tuple = (1e-3, 5.),
+    **kwargs
+):
+    """Implied volatilities of a whole chain of quotes at once, with tree prices (see price_chain).
+
+    Each iteration prices all the quotes yet to converge in a single batched backward induction. The iterations start 
+    from the Black-Scholes implied volatilities (quotes taken as european options), take one Newton step (Black-Scholes vega)
+    and then secant steps, falling back to bisection whenever a step leaves the bracket around the solution.
+
+    Args:
+        price (float or array): quoted option prices
+        S0 (float or array): underlying asset spot price at t0
+        K (float or array): strike
+        T (float or array): expiration (units are the same period as the risk free rate)
+        r (float or array): risk-free rate
+        q (float or array, optional): rate at which the underlying asset pays out dividends. Defaults to 0.
+        option_type (str or array, optional): 'call' or 'put'. Defaults to 'call'
+        exercise (str or array, optional): 'european' or 'american'. Defaults to 'american'
+        N (int, optional): number of instants in time in every tree. Defaults to 200
+        tol (float, optional): tolerance on the tree price (absolute). Defaults to 1e-6
+        max_iter (int, optional): maximum number of iterations. Defaults to 50
+        vol_bounds (tuple, optional): lowest and highest volatilities searched. Defaults to (0.1%, 500%)
+        all other keyword arguments are passed on to the tree pricing classes (e.g. dtype = np.float32)
+
+    Returns:
+        tuple: implied volatilities and whether each of them converged (arrays with the broadcast shape of the inputs).
+            Quotes out of the range of prices spanned by vol_bounds have NaN volatilities
+    """
+    price, S0, K, T, r, q, option_type, exercise = np.broadcast_arrays(
+        price, S0, K, T, r, q, option_type, exercise
+    )
+    shape = price.shape
+
+    quotes = dict(S0 = S0, K = K, T = T, r = r, q = q)
+    quotes = { name: np.asarray(param, dtype = float).ravel() for name, param in quotes.items() }
+    quotes.update(option_type = option_type.ravel(), exercise = exercise.ravel())
+    target = np.asarray(price, dtype = float).ravel()
+
+    def objective(vol, idx):
+        # tree price minus the quote, for the quotes at idx
+        params = { name: param[idx] for name, param in quotes.items() }
+        return price_chain(vol = vol, N = N, **params, **kwargs) - target[idx]
+
+    # bracket around the solution: prices increase with volatility.
+    # below |r - q| * sqrt(dT), the risk-free proportions of the binomial tree fall outside [0, 1]
+    dT = quotes['T'] / (N - 1)
+    lower = np.maximum(vol_bounds[0], 1.01 * np.abs(quotes['r'] - quotes['q']) * np.sqrt(dT))
+    upper = np.full(target.shape, vol_bounds[1], dtype = float)
+    all_idx = np.arange(target.size)
+    f_lower, f_upper = objective(lower, all_idx), objective(upper, all_idx)
+    bracketed = (f_lower <= tol) & (f_upper >= -tol)
+
+    # warm start from black-scholes (early exercise premiums may leave quotes without a european solution: start those mid-bracket)
+    option_type = np.char.lower(quotes['option_type'].astype(str))
+    vol, _ = implied_vol(price = target, option_type = option_type, vol_bounds = vol_bounds, max_iter = 20, **{ 
+        name: quotes[name] for name in ['S0', 'K', 'T', 'r', 'q'] 
+    })
+    vol = np.clip(np.where(np.isnan(vol), (lower + upper) / 2, vol), lower, upper)
+
+    converged = bracketed & ((np.abs(f_lower) <= tol) | (np.abs(f_upper) <= tol))
+    vol = np.where(np.abs(f_lower) <= tol, lower, np.where(np.abs(f_upper) <= tol, upper, vol))
+    vol_previous = np.full(target.shape, np.nan)
+    f_previous = np.full(target.shape, np.nan)
+    
+    for _ in range(max_iter):
+        idx = np.flatnonzero(bracketed & ~converged)
+        if idx.size == 0:
+            break
+
+        f = objective(vol[idx], idx)
+        converged[idx] = np.abs(f) <= tol
+
+        # shrink the bracket
+        below = f < 0
+        lower[idx] = np.where(below, vol[idx], lower[idx])
+        upper[idx] = np.where(below, upper[idx], vol[idx])
+
+        # first step: newton with black-scholes vega. afterwards: secant
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            first = np.isnan(f_previous[idx])
+            slope = np.where(
+                first,
+                BlackScholes(vol = vol[idx], **{ name: quotes[name][idx] for name in ['S0', 'K', 'T', 'r', 'q'] }).vega,
+                (f - f_previous[idx]) / (vol[idx] - vol_previous[idx])
+            )
+            step = vol[idx] - f / slope
+
+        # bisection whenever the step leaves the bracket
+        bisection = (lower[idx] + upper[idx]) / 2
+        step = np.where(np.isfinite(step) & (step > lower[idx]) & (step < upper[idx]), step, bisection)
+
+        vol_previous[idx], f_previous[idx] = vol[idx], f
+        vol[idx] = np.where(converged[idx], vol[idx], step)
+
+    vol = np.where(bracketed, vol, np.nan)
+
+    return vol.reshape(shape), converged.reshape(shape)
+
+
+def price_book(book: pd.DataFrame, processes: int = None, chunksize: int = 2_000, N: int = 200, closed_form: bool = False, **kwargs):
+    """Prices a book of contracts of any of the MODELS over a pool of processes.
+
+    Contracts of the same model and number of instants in time (and exercise dates) are grouped together and priced in batches of 
+    up to chunksize contracts (one backward induction per batch, see price_chain). The batches are spread over the processes.
+    If a batch fails, its contracts are priced one by one, so that a bad contract only fails itself. Barrier contracts are 
+    always priced one by one, so that each tree is aligned to its barrier.
+
+    Args:
+        book (pd.DataFrame): one contract per row, with columns 'model' (name of the class in MODELS, e.g. 'AmericanPutStockOption'), 
+            'S0', 'K', 'r', 'vol', 'T' and, optionally, 'q' (defaults to 0) and 'N'. Barrier contracts need a 'barrier' column 
+            and bermudan contracts an 'exercise_dates' column (a list of dates per contract): contracts missing them are errors
+        processes (int, optional): number of worker processes. If 1, prices in the current process. Defaults to the number of processors
+        chunksize (int, optional): maximum number of contracts priced together. Defaults to 2,000
+        N (int, optional): number of instants in time of the contracts without an 'N' column. Defaults to 200
+        closed_form (bool, optional): whether to price european vanilla contracts with the closed form model of their asset 
+            (Black-Scholes, Black-76 or Garman-Kohlhagen) instead of the tree. Defaults to False
+        all other keyword arguments are passed on to the tree pricing classes (e.g. dtype = np.float32)
+
+    Returns:
+        pd.DataFrame: columns 'price' and 'error' (None if the contract was priced), aligned to the book index
+    """
+    book = pd.DataFrame(book)
+
+    missing = { 'model', 'S0', 'K', 'r', 'vol', 'T' } - set(book.columns)
+    if missing:
+        raise ValueError(f"Book is missing columns {sorted(missing)}.")
+
+    specs = book.reset_index(drop = True)
+    specs = specs.assign(
+        q = specs['q'] if 'q' in specs else 0,
+        N = specs['N'] if 'N' in specs else N,
+        barrier = specs['barrier'] if 'barrier' in specs else np.nan,
+        # exercise dates are shared by a whole batch, so they are part of the batch key
+        exercise_dates = specs['exercise_dates'].map(
+            lambda dates: tuple(dates) if isinstance(dates, (list, tuple, np.ndarray)) else None
+        ) if 'exercise_dates' in specs else None,
+    )
+
+    prices = np.full(len(specs), np.nan)
+    errors = np.full(len(specs), None, dtype = object)
+    models = { model.__name__: model for model in MODELS }
+
+    # batches of contracts of the same model, number of instants and exercise dates
+    tasks = []
+    for (model_name, steps, dates), group in specs.groupby(['model', 'N', 'exercise_dates'], sort = False, dropna = False):
+        model = models.get(model_name, None)
+        is_barrier = model is not None and issubclass(model, BarrierOption)
+        is_bermudan = model is not None and issubclass(model, BermudanOption)
+
+        if (is_barrier and 'barrier' not in book) or (is_bermudan and not isinstance(dates, tuple)):
+            column = 'barrier' if is_barrier else 'exercise_dates'
+            errors[group.index] = f"ValueError: {model_name} contracts need the {column!r} column."
+            continue
+
+        names = ['S0', 'K', 'r', 'q', 'vol', 'T'] + (['barrier'] if is_barrier else [])
+        chunk_kwargs = { **kwargs, 'exercise_dates': list(dates) } if is_bermudan else kwargs
+
+        for start in range(0, len(group), chunksize):
+            chunk = group.iloc[start:start + chunksize]
+            params = { name: chunk[name].to_numpy(dtype = float) for name in names }
+            tasks.append((chunk.index.to_numpy(), (model_name, steps, params, closed_form, chunk_kwargs)))
+
+    if processes == 1 or len(tasks) <= 1:
+        results = [ _price_book_chunk(*task) for _, task in tasks ]
+    else:
+        with ProcessPoolExecutor(max_workers = processes) as executor:
+            results = list(executor.map(_price_book_chunk, *zip(*[ task for _, task in tasks ])))
+
+    for (positions, _), (chunk_prices, chunk_errors) in zip(tasks, results):
+        prices[positions] = chunk_prices
+        errors[positions] = chunk_errors
+
+    return pd.DataFrame({ 'price': prices, 'error': errors }, index = book.index)
+
+
+def _price_book_chunk(model_name, N, params, closed_form, kwargs):
+    # prices a batch of contracts of the same model. Runs on the worker processes
+    size = len(params['S0'])
+    prices = np.full(size, np.nan)
+    errors = np.full(size, None, dtype = object)
+
+    models = { model.__name__: model for model in MODELS }
+
+    finite = np.all([ np.isfinite(param) for param in params.values() ], axis = 0)
+    errors[~finite] = 'ValueError: Contract parameters must be finite.'
+    idx = np.flatnonzero(finite)
+    params = { name: param[idx] for name, param in params.items() }
+
+    def get_model():
+        if model_name not in models:
+            raise KeyError(f"Unknown model {model_name!r}.")
+        return models[model_name]
+
+    def get_prices(params):
+        # european vanilla contracts are priced in closed form, if asked to. All others, on the tree
+        model = get_model()
+
+        if closed_form and issubclass(model, EuropeanOption) and not issubclass(model, BarrierOption):
+            european = model.closed_form(**params)
+            return european.call if issubclass(model, Call) else european.put
+
+        return model(N = int(N), full_tree = False, **params, **kwargs).price
+
+    def get_prices_one_by_one():
+        # find out which contracts fail
+        for i, position in enumerate(idx):
+            try:
+                prices[position] = get_prices({ name: param[i] for name, param in params.items() })
+            except Exception as error:
+                errors[position] = f'{type(error).__name__}: {error}'
+
+    # barriers are aligned to the parameters of each contract (scalars only), so barrier contracts are priced one by one
+    if 'barrier' in params:
+        get_prices_one_by_one()
+    else:
+        try:
+            # one row per contract, so that parameters broadcast against the nodes of each level
+            if idx.size > 0:
+                prices[idx] = np.reshape(get_prices({ name: param[:, np.newaxis] for name, param in params.items() }), idx.size)
+
+        except Exception:
+            get_prices_one_by_one()
+
+    errors[~np.isfinite(prices) & (errors == None)] = 'Price is not finite.'
+
+    return prices, errors
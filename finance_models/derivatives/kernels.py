@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+"""Compiled lattice kernels for the binomial tree pricing models.
+
+The kernels are compiled to machine code with numba, if it is installed. Otherwise, they are plain python functions
+(slow, but with the same results) and the tree pricing models use their numpy implementation instead (see NUMBA_AVAILABLE).
+"""
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # optional dependency
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+
+def jit(function):
+    """compiles function with numba (nopython mode, cached on disk), if available. Otherwise, returns it unchanged"""
+    if numba is None:
+        return function
+
+    return numba.njit(cache = True)(function)
+
+
+@jit
+def exercise_value(value, spot, strike, is_call):
+    """value of an american option node: the higher of keeping it (value) and exercising it at spot"""
+    intrinsic = spot - strike if is_call else strike - spot
+
+    if intrinsic > value and intrinsic > 0:
+        return intrinsic
+
+    return value
+
+
+@jit
+def binomial_asset_tree(tree, S0, u, d, log_space):
+    """fills the dense (N x N) binomial tree of asset prices, in place. Node j of level i went up j times and down (i - j) times"""
+    for i in range(tree.shape[0]):
+        for j in range(i + 1):
+            if log_space:
+                tree[i, j] = np.exp(np.log(S0) + j * np.log(u) + (i - j) * np.log(d))
+            else:
+                tree[i, j] = S0 * u ** j * d ** (i - j)
+
+
+@jit
+def binomial_backward_induction(values, spots, d, p, discount, strike, is_call, american, start, stop, boundary):
+    """rolls back the derivative prices (values) and the asset prices (spots) of a single binomial tree, in place,
+    from the level after start down to level stop. The critical asset price of each level on which an american option
+    is exercised is written to boundary (NaN if it isn't exercised)"""
+    for i in range(start, stop - 1, -1):
+        critical = np.nan
+
+        for j in range(i + 1):
+            values[j] = ((1 - p) * values[j] + p * values[j + 1]) * discount
+            spots[j] = spots[j] / d
+
+            if american:
+                value = exercise_value(values[j], spots[j], strike, is_call)
+
+                if value != values[j]:
+                    values[j] = value
+                    if np.isnan(critical) or (is_call and spots[j] < critical) or (not is_call and spots[j] > critical):
+                        critical = spots[j]
+
+        if american:
+            boundary[i] = critical
+
+
+@jit
+def binomial_backward_induction_tree(asset_tree, derivative_tree, p, discount, strike, is_call, american, boundary):
+    """fills the derivative tree, in place, from its last level (the payoff) back to its root.
+    The critical asset prices are written to boundary, as in binomial_backward_induction"""
+    for i in range(derivative_tree.shape[0] - 2, -1, -1):
+        critical = np.nan
+
+        for j in range(i + 1):
+            value = ((1 - p) * derivative_tree[i + 1, j] + p * derivative_tree[i + 1, j + 1]) * discount
+
+            if american:
+                spot = asset_tree[i, j]
+                exercised = exercise_value(value, spot, strike, is_call)
+
+                if exercised != value:
+                    value = exercised
+                    if np.isnan(critical) or (is_call and spot < critical) or (not is_call and spot > critical):
+                        critical = spot
+
+            derivative_tree[i, j] = value
+
+        if american:
+            boundary[i] = critical
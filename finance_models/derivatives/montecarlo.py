@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+"""Monte Carlo pricing of european and path-dependent options (asian, lookback and barrier).
+
+Asset prices follow the same risk-neutral dynamics as the tree pricing models: a geometric brownian motion growing at
+r - q, where futures have q = r and currencies have q = rf. Paths are simulated in chunks of a fixed number of paths, 
+so memory stays bounded however many paths are requested. Each chunk draws from its own random stream (spawned from a 
+single seed), so results don't depend on how the chunks are spread over the worker processes.
+"""
+
+import os
+from abc import abstractmethod, ABC
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from . import BlackScholes, Black76, GarmanKohlhagen
+
+
+MonteCarloResult = namedtuple('MonteCarloResult', ['price', 'stderr', 'paths', 'converged'])
+MonteCarloResult.__doc__ = """Monte Carlo price estimate: price, its standard error, number of paths simulated and 
+whether the target standard error was reached"""
+
+
+class MonteCarloPricing(ABC):
+    """Monte Carlo pricing model for derivatives.
+    Abstract class (do not instantiate it directly)
+    """
+
+    # whether the payoff depends on the whole path (otherwise, only the final asset price is simulated)
+    path_dependent = True
+
+    def __init__(self,
+        S0: float,
+        K: float,
+        r: float,
+        T: float,
+        vol: float,
+        q: float = 0,
+        *args,
+        steps: int = 100,
+        paths: int = 100_000,
+        chunksize: int = 10_000,
+        processes: int = 1,
+        seed: int = None,
+        antithetic: bool = True,
+        control_variate: bool = False,
+        tol: float = None,
+        **kwargs
+    ):
+        """Monte Carlo pricing model
+
+        Args:
+            S0 (float): underlying asset spot price at t0
+            K (float): strike
+            r (float): risk-free rate (in % p.p.)
+            T (float): expiration (same period as the risk free rate)
+            vol (float): volatility (same period as the risk free rate)
+            q (float, optional): rate at which the underlying asset pays out dividends. Defaults to 0.
+            steps (int, optional): number of monitoring dates of path-dependent payoffs, evenly spaced up to T. Defaults to 100
+            paths (int, optional): maximum number of paths simulated. Defaults to 100,000
+            chunksize (int, optional): number of paths simulated at a time (the memory used is proportional to chunksize x steps). 
+                Defaults to 10,000
+            processes (int, optional): number of worker processes. If 1, simulates in the current process. If None, 
+                uses the number of processors. Defaults to 1
+            seed (int, optional): seed of the random streams. Defaults to None (unpredictable)
+            antithetic (bool, optional): whether to pair each path with its mirror (antithetic variates). Defaults to True
+            control_variate (bool, optional): whether to correct the price with the european option on the same paths, 
+                whose price is known in closed form (the correction is scaled by the regression coefficient of the payoffs). 
+                Defaults to False
+            tol (float, optional): target standard error. Simulation stops as soon as it is reached. Defaults to None 
+                (simulates all paths)
+        """
+        self.S0 = S0
+        self.K = K
+        self.r = r
+        self.T = T
+        self.q = q
+        self.vol = self._get_check_vol(vol)
+
+        self.steps = self._get_check_positive_int(steps, 'steps')
+        self.paths = self._get_check_positive_int(paths, 'paths')
+        self.chunksize = self._get_check_positive_int(chunksize, 'chunksize')
+        self.processes = processes
+        self.seed = seed
+        self.antithetic = antithetic
+        self.control_variate = control_variate
+        self.tol = tol
+
+        self._result = None
+
+    def _get_check_vol(self, vol):
+        if vol < 0:
+            raise ValueError(f"Volatility must be non-negative.")
+        
+        return vol
+
+    def _get_check_positive_int(self, value, argname):
+        if int(value) != value or value <= 0:
+            raise ValueError(f"Argument '{argname}' must be an integer greater than zero.")
+        
+        return int(value)
+
+    @abstractmethod
+    def option_price(self, spot, strike):
+        """payoff of the option at spot"""
+        raise NotImplementedError("'option_price()' method on this model is not implemented.")
+
+    @abstractmethod
+    def payoff(self, paths):
+        """payoff of each path (rows of paths, columns are the monitoring dates, starting at t0)"""
+        raise NotImplementedError("'payoff()' method on this model is not implemented.")
+
+    @property
+    def result(self):
+        """price estimate (see MonteCarloResult). Simulated once, on first access"""
+        if self._result is None:
+            self._result = self.simulate()
+
+        return self._result
+
+    @property
+    def price(self):
+        return self.result.price
+
+    @property
+    def stderr(self):
+        return self.result.stderr
+
+    def simulate(self):
+        """simulates the paths, chunk by chunk, until all paths were simulated or the target standard error is reached
+
+        Returns:
+            MonteCarloResult: price estimate
+        """
+        chunks = -(-self.paths // self.chunksize)
+        sizes = [ min(self.chunksize, self.paths - i * self.chunksize) for i in range(chunks) ]
+        streams = np.random.SeedSequence(self.seed).spawn(chunks)
+
+        # chunks are simulated in waves of one chunk per process. The target is checked after each wave
+        processes = self.processes or os.cpu_count()
+        executor = ProcessPoolExecutor(max_workers = processes) if processes > 1 and chunks > 1 else None
+
+        totals = np.zeros(6)
+        converged = False
+
+        try:
+            for start in range(0, chunks, processes):
+                wave = (streams[start:start + processes], sizes[start:start + processes])
+
+                if executor is None:
+                    stats = list(map(self.simulate_chunk, *wave))
+                else:
+                    stats = list(executor.map(self.simulate_chunk, *wave))
+
+                totals += np.sum(stats, axis = 0)
+                price, stderr = self._estimate(totals)
+
+                if self.tol is not None and totals[0] > 1 and stderr <= self.tol:
+                    converged = True
+                    break
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        paths = int(totals[0]) * (2 if self.antithetic else 1)
+
+        return MonteCarloResult(price = price, stderr = stderr, paths = paths, converged = converged)
+
+    def simulate_paths(self, stream, size):
+        """simulates size paths of the asset price (antithetic paths in the second half), from a random stream"""
+        rng = np.random.default_rng(stream)
+        steps = self.steps if self.path_dependent else 1
+        dT = self.T / steps
+
+        shocks = rng.standard_normal((-(-size // 2) if self.antithetic else size, steps))
+        if self.antithetic:
+            shocks = np.concatenate([shocks, -shocks])
+
+        # log returns, accumulated in place
+        log_paths = (self.r - self.q - self.vol**2 / 2) * dT + self.vol * np.sqrt(dT) * shocks
+        np.cumsum(log_paths, axis = 1, out = log_paths)
+
+        paths = np.empty((log_paths.shape[0], steps + 1))
+        paths[:, 0] = self.S0
+        paths[:, 1:] = self.S0 * np.exp(log_paths)
+
+        return paths
+
+    def simulate_chunk(self, stream, size):
+        """simulates a chunk of paths and returns the sums needed for the estimate: number of samples and sums of 
+        the discounted payoffs (y), of the european payoffs on the same paths (x), and of their squares and cross products"""
+        paths = self.simulate_paths(stream, size)
+        discount = np.exp(-self.r * self.T)
+
+        y = discount * self.payoff(paths)
+        x = discount * self.option_price(paths[:, -1], self.K)
+
+        # antithetic pairs are a single sample
+        if self.antithetic:
+            half = paths.shape[0] // 2
+            y = (y[:half] + y[half:]) / 2
+            x = (x[:half] + x[half:]) / 2
+
+        return np.array([y.size, y.sum(), (y**2).sum(), x.sum(), (x**2).sum(), (x * y).sum()])
+
+    def _estimate(self, totals):
+        # price and standard error from the sums of the samples
+        n, sum_y, sum_y2, sum_x, sum_x2, sum_xy = totals
+        mean_y, mean_x = sum_y / n, sum_x / n
+        var_y = max(sum_y2 - n * mean_y**2, 0) / max(n - 1, 1)
+
+        if not self.control_variate:
+            return mean_y, np.sqrt(var_y / n)
+
+        var_x = max(sum_x2 - n * mean_x**2, 0) / max(n - 1, 1)
+        cov_xy = (sum_xy - n * mean_x * mean_y) / max(n - 1, 1)
+        beta = cov_xy / var_x if var_x > 0 else 0.
+
+        price_closed_form = self.closed_form_price(spot = self.S0, strike = self.K, T = self.T)
+        price = mean_y - beta * (mean_x - price_closed_form)
+        var = max(var_y - beta * cov_xy, 0)
+
+        return price, np.sqrt(var / n)
+
+    def __str__(self):
+        return f'{self.__class__.__name__}: S0 = {self.S0}, K = {self.K}, r = {self.r}, q = {self.q}, T = {self.T}, vol = {self.vol}'
+
+
+# assets
+class Stock(MonteCarloPricing, ABC):
+    """abstract class implementing a stock asset, paying out dividends at a rate of q"""
+
+    # closed form european option pricing model of the asset
+    closed_form = BlackScholes
+
+
+class Futures(Stock, ABC):
+    """abstract class implementing a futures contract asset: it grows at no rate at all (q = r). S0 is the futures price"""
+
+    closed_form = Black76
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.q = self.r
+
+
+class Currency(Stock, ABC):
+    """abstract class implementing a currency asset: the foreign risk-free rate rf plays the part of the dividend rate (q = rf)"""
+
+    closed_form = GarmanKohlhagen
+
+    def __init__(self, *args, rf: float = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rf = rf
+        if self.rf is not None:
+            self.q = self.rf
+
+
+# payoff rules
+class Call(MonteCarloPricing, ABC):
+    """abstract class implementing the pricing rule for a call option"""
+    def option_price(self, spot, strike):
+        return np.maximum(spot - strike, 0)
+
+    def closed_form_price(self, spot, strike, T):
+        """european price with time T to expiration, from the closed form model of the asset (e.g. Black-Scholes)"""
+        return self.closed_form(S0 = spot, K = strike, r = self.r, T = T, vol = self.vol, q = self.q).call
+
+    def extreme_price(self, paths):
+        """most favorable asset price of each path"""
+        return np.max(paths, axis = 1)
+
+
+class Put(MonteCarloPricing, ABC):
+    """abstract class implementing the pricing rule for a put option"""
+    def option_price(self, spot, strike):
+        return np.maximum(strike - spot, 0)
+
+    def closed_form_price(self, spot, strike, T):
+        """european price with time T to expiration, from the closed form model of the asset (e.g. Black-Scholes)"""
+        return self.closed_form(S0 = spot, K = strike, r = self.r, T = T, vol = self.vol, q = self.q).put
+
+    def extreme_price(self, paths):
+        """most favorable asset price of each path"""
+        return np.min(paths, axis = 1)
+
+
+# payoff styles
+class EuropeanOption(MonteCarloPricing, ABC):
+    """abstract class implementing an option on the final asset price"""
+
+    path_dependent = False
+
+    def payoff(self, paths):
+        return self.option_price(paths[:, -1], self.K)
+
+
+class AsianOption(MonteCarloPricing, ABC):
+    """abstract class implementing an option on the arithmetic average of the asset price over the monitoring dates (t0 excluded)"""
+
+    def payoff(self, paths):
+        return self.option_price(paths[:, 1:].mean(axis = 1), self.K)
+
+
+class LookbackOption(MonteCarloPricing, ABC):
+    """abstract class implementing a fixed strike lookback option: on the highest (call) or lowest (put) asset price 
+    over the monitoring dates"""
+
+    def payoff(self, paths):
+        return self.option_price(self.extreme_price(paths), self.K)
+
+
+class BarrierOption(MonteCarloPricing, ABC):
+    """abstract class implementing a barrier on an european payoff: the option is knocked in or out once the asset price 
+    reaches the barrier on any of the monitoring dates"""
+
+    # 'up' (barrier above the spot price) or 'down' (barrier below the spot price)
+    barrier_direction = None
+    # 'out' (the option ceases to exist once knocked) or 'in' (the option only exists once knocked)
+    barrier_knock = None
+
+    def __init__(self, *args, barrier: float = None, **kwargs):
+        """
+        Args:
+            barrier (float): asset price at which the option is knocked in or out. Defaults to none (never reached)
+        """
+        super().__init__(*args, **kwargs)
+        self.barrier = barrier
+
+    def knocked(self, paths):
+        """mask of the paths which reach the barrier"""
+        if self.barrier is None:
+            return np.zeros(paths.shape[0], dtype = bool)
+
+        if self.barrier_direction == 'up':
+            return np.max(paths, axis = 1) >= self.barrier
+
+        return np.min(paths, axis = 1) <= self.barrier
+
+    def payoff(self, paths):
+        alive = self.knocked(paths) == (self.barrier_knock == 'in')
+        return np.where(alive, self.option_price(paths[:, -1], self.K), 0)
+
+
+class UpAndOutBarrier(BarrierOption, ABC):
+    barrier_direction = 'up'
+    barrier_knock = 'out'
+
+
+class DownAndOutBarrier(BarrierOption, ABC):
+    barrier_direction = 'down'
+    barrier_knock = 'out'
+
+
+class UpAndInBarrier(BarrierOption, ABC):
+    barrier_direction = 'up'
+    barrier_knock = 'in'
+
+
+class DownAndInBarrier(BarrierOption, ABC):
+    barrier_direction = 'down'
+    barrier_knock = 'in'
+
+
+# stock options
+class EuropeanCallStockOption(Stock, EuropeanOption, Call):
+    pass
+
+
+class EuropeanPutStockOption(Stock, EuropeanOption, Put):
+    pass
+
+
+class AsianCallStockOption(Stock, AsianOption, Call):
+    pass
+
+
+class AsianPutStockOption(Stock, AsianOption, Put):
+    pass
+
+
+class LookbackCallStockOption(Stock, LookbackOption, Call):
+    pass
+
+
+class LookbackPutStockOption(Stock, LookbackOption, Put):
+    pass
+
+
+
+# futures options
+class EuropeanCallFuturesOption(Futures, EuropeanOption, Call):
+    pass
+
+
+class EuropeanPutFuturesOption(Futures, EuropeanOption, Put):
+    pass
+
+
+class AsianCallFuturesOption(Futures, AsianOption, Call):
+    pass
+
+
+class AsianPutFuturesOption(Futures, AsianOption, Put):
+    pass
+
+
+class LookbackCallFuturesOption(Futures, LookbackOption, Call):
+    pass
+
+
+class LookbackPutFuturesOption(Futures, LookbackOption, Put):
+    pass
+
+
+
+# currency options
+class EuropeanCallCurrencyOption(Currency, EuropeanOption, Call):
+    pass
+
+
+class EuropeanPutCurrencyOption(Currency, EuropeanOption, Put):
+    pass
+
+
+class AsianCallCurrencyOption(Currency, AsianOption, Call):
+    pass
+
+
+class AsianPutCurrencyOption(Currency, AsianOption, Put):
+    pass
+
+
+class LookbackCallCurrencyOption(Currency, LookbackOption, Call):
+    pass
+
+
+class LookbackPutCurrencyOption(Currency, LookbackOption, Put):
+    pass
+
+
+# barrier options
+class UpAndOutCallStockOption(Stock, UpAndOutBarrier, Call):
+    pass
+
+
+class UpAndOutPutStockOption(Stock, UpAndOutBarrier, Put):
+    pass
+
+
+class DownAndOutCallStockOption(Stock, DownAndOutBarrier, Call):
+    pass
+
+
+class DownAndOutPutStockOption(Stock, DownAndOutBarrier, Put):
+    pass
+
+
+class UpAndInCallStockOption(Stock, UpAndInBarrier, Call):
+    pass
+
+
+class UpAndInPutStockOption(Stock, UpAndInBarrier, Put):
+    pass
+
+
+class DownAndInCallStockOption(Stock, DownAndInBarrier, Call):
+    pass
+
+
+class DownAndInPutStockOption(Stock, DownAndInBarrier, Put):
+    pass
+
+
+BUILDINGBLOCKS = { 
+    mcmodel for mcmodel in locals().values() 
+    if (
+        isinstance(mcmodel, type) and                      # object is a class
+        ABC in getattr(mcmodel, '__bases__', set())        # class inherits directly from ABC
+   )
+}
+
+MODELS = { 
+    mcmodel for mcmodel in locals().values() 
+    if (
+        isinstance(mcmodel, type) and                         # object is a class
+        not getattr(mcmodel, '__abstractmethods__', [1]) and  # set of abstract methods is empty
+        ABC not in getattr(mcmodel, '__bases__', set()) and   # class does not inherit directly from ABC
+        mcmodel != ABC                                        # class isn't ABC
+   )
+}
@@ -3,8 +3,12 @@
 
 import numpy as np
 import pandas as pd
+from scipy.stats import norm
 from .. import portfolio, tools, volatility as volm
+from .. import derivatives
 from ..derivatives import binomialtree as bt
+import os
+import tempfile
 import unittest
 
 import warnings
@@ -1077,6 +1081,10 @@ class TestBinomialTree(unittest.TestCase):
             index = pf_params_idx
         )
 
+        # futures prices follow the stock prices
+        self.secs['Futures'] = self.secs['Stock']
+        secs_names = secs_names + ['Futures']
+
         self.pfs = {
             asset_name: portfolio.Portfolio(securities_values = self.secs[asset_name]) 
             for asset_name in secs_names
@@ -1186,6 +1194,8 @@ class TestBinomialTree(unittest.TestCase):
                         **self.params_portfolio[asset_name]
                     )
                     break
+            else:
+                self.fail(f"No params_portfolio fixture for the asset of {der_name}.")
             
             # ... and search the assets info for portfolio building parameters:
             for asset_name in self.params_portfolio_build:
@@ -1196,6 +1206,8 @@ class TestBinomialTree(unittest.TestCase):
                         **self.params_portfolio_build[asset_name]
                     )
                     break
+            else:
+                self.fail(f"No params_portfolio_build fixture for the asset of {der_name}.")
         
             self.assertAlmostEqual(
                 M(der_portfolio.S0), default_S0, places = 0,
@@ -1254,6 +1266,8 @@ class TestBinomialTree(unittest.TestCase):
                     # if we find it, store it and break out of the loop
                     option = option_model(**self.params[asset_name])
                     break
+            else:
+                self.fail(f"No params fixture for the asset of {der_name}.")
                 
             # run the calculations
             price = M(option.price)
@@ -1291,6 +1305,8 @@ class TestBinomialTree(unittest.TestCase):
                     # if we find it, store it and break out of the loop
                     option = option_model(**self.params_portfolio_build[asset_name])
                     break
+            else:
+                self.fail(f"No params_portfolio fixture for the asset of {der_name}.")
                 
             # run the calculations
             price = M(option.price)
@@ -1328,6 +1344,8 @@ class TestBinomialTree(unittest.TestCase):
                     # if we find it, store it and break out of the loop
                     option = option_model(**self.params_portfolio_build[asset_name])
                     break
+            else:
+                self.fail(f"No params_portfolio_build fixture for the asset of {der_name}.")
                 
             # run the calculations
             price = M(option.price)
@@ -1339,3 +1357,777 @@ class TestBinomialTree(unittest.TestCase):
                     f"Expected {price_expected}, got {price}"
                 )
             )
+
+    def test_vectorized_matches_nodes(self):
+
+        # the level-vectorized backward induction must reproduce the node by node prices
+        for cls in bt.MODELS:
+            der_name = cls.__name__
+            for asset_name in self.params:
+                if asset_name in der_name:
+                    params = { **self.params[asset_name], 'N': 50 }
+                    break
+            else:
+                self.fail(f"No params fixture for the asset of {der_name}.")
+
+            price_vectorized = cls(**params).price
+            price_nodes = cls(vectorized = False, **params).price
+
+            self.assertAlmostEqual(
+                price_vectorized, price_nodes, places = 10,
+                msg = (
+                    f"Vectorized derivative {der_name} price differs from the node by node price. "
+                    f"Expected {price_nodes}, got {price_vectorized}"
+                )
+            )
+
+    def test_price_only_matches_full_tree(self):
+
+        # the rolling (price-only) mode must reproduce the full tree prices, without building the trees
+        for cls in bt.MODELS:
+            der_name = cls.__name__
+            for asset_name in self.params:
+                if asset_name in der_name:
+                    params = self.params[asset_name]
+                    break
+            else:
+                self.fail(f"No params fixture for the asset of {der_name}.")
+
+            option = cls(full_tree = False, **params)
+            price_rolling = option.price
+            price_full = cls(**params).price
+
+            self.assertAlmostEqual(
+                price_rolling, price_full, places = 10,
+                msg = (
+                    f"Price-only derivative {der_name} price differs from the full tree price. "
+                    f"Expected {price_full}, got {price_rolling}"
+                )
+            )
+
+            self.assertIsNone(
+                getattr(option, 'asset_price_tree', None),
+                msg = f"Price-only derivative {der_name} must not build the asset price tree."
+            )
+
+    def test_closed_form_asset_tree(self):
+
+        # the closed form asset tree (regular and log space) must reproduce the node by node tree
+        for cls in bt.MODELS:
+            der_name = cls.__name__
+            for asset_name in self.params:
+                if asset_name in der_name:
+                    params = { **self.params[asset_name], 'N': 50 }
+                    break
+            else:
+                self.fail(f"No params fixture for the asset of {der_name}.")
+
+            tree_nodes = cls(vectorized = False, **params).build_asset_tree()
+            tree_closed_form = cls(**params).build_asset_tree()
+            tree_log_space = cls(log_space = True, **params).build_asset_tree()
+
+            np.testing.assert_allclose(
+                tree_closed_form, tree_nodes, rtol = 1e-12,
+                err_msg = f"Closed form asset tree for {der_name} differs from the node by node tree."
+            )
+            np.testing.assert_allclose(
+                tree_log_space, tree_nodes, rtol = 1e-12,
+                err_msg = f"Log space asset tree for {der_name} differs from the node by node tree."
+            )
+
+    def test_price_chain(self):
+
+        params = self.params['Stock']
+        S0 = params['S0']
+
+        K = S0 * np.array([0.8, 0.9, 1.0, 1.1, 1.2, 1.0, 0.9, 1.1])
+        T = np.array([0.25, 0.5, 0.25, 1.0, 0.5, 0.75, 0.25, 0.5])
+        vol = params['vol'] * np.array([1.0, 1.2, 0.8, 1.0, 1.1, 0.9, 1.0, 1.3])
+        option_type = np.array(['call', 'put', 'put', 'call', 'put', 'call', 'put', 'call'])
+        exercise = np.array(['european', 'american', 'european', 'american', 'american', 'european', 'american', 'european'])
+
+        prices = bt.price_chain(
+            S0 = S0, K = K, T = T, vol = vol, r = params['r'], q = 0.01,
+            option_type = option_type, exercise = exercise, N = params['N']
+        )
+
+        self.assertEqual(prices.shape, K.shape)
+
+        # each contract priced on its own must match its chain price
+        for i, price in enumerate(prices):
+            model = bt.CHAIN_MODELS[(option_type[i], exercise[i])]
+            option = model(S0 = S0, K = K[i], T = T[i], vol = vol[i], r = params['r'], q = 0.01, N = params['N'])
+
+            self.assertAlmostEqual(
+                price, option.price, places = 10,
+                msg = (
+                    f"Wrong chain price for contract {i} ({model.__name__}). "
+                    f"Expected {option.price}, got {price}"
+                )
+            )
+
+        with self.assertRaises(ValueError, msg = "price_chain: must raise ValueError on unknown option types."):
+            bt.price_chain(S0 = S0, K = K, T = T, vol = vol, r = params['r'], option_type = 'straddle')
+
+    def test_implied_vol_chain(self):
+
+        params = self.params['Stock']
+        S0, r = params['S0'], params['r']
+
+        K = S0 * np.array([0.8, 0.9, 1.0, 1.1, 1.2, 1.0])
+        T = np.array([0.25, 0.5, 0.25, 1.0, 0.5, 0.75])
+        vol = np.array([0.15, 0.25, 0.35, 0.2, 0.3, 0.45])
+        option_type = np.array(['call', 'put', 'put', 'call', 'put', 'call'])
+
+        prices = bt.price_chain(S0 = S0, K = K, T = T, vol = vol, r = r, q = 0.01, option_type = option_type, exercise = 'american', N = 100)
+
+        # a quote above the price of any volatility
+        prices[-1] = 10 * S0
+
+        implied, converged = bt.implied_vol_chain(
+            price = prices, S0 = S0, K = K, T = T, r = r, q = 0.01, option_type = option_type, exercise = 'american', N = 100
+        )
+
+        np.testing.assert_array_equal(converged, [True] * 5 + [False])
+        self.assertTrue(np.isnan(implied[-1]))
+
+        for i in range(5):
+            self.assertAlmostEqual(
+                implied[i], vol[i], places = 5,
+                msg = f"Wrong implied volatility for quote {i}. Expected {vol[i]}, got {implied[i]}"
+            )
+
+    def test_asset_tree_cache(self):
+
+        params = { k: v for k, v in self.params['Stock'].items() if k != 'K' }
+        S0 = params['S0']
+        strikes = S0 * np.linspace(0.8, 1.2, 20)
+
+        bt.ASSET_TREE_CACHE.clear()
+
+        # calls and puts on the same underlying must share a single asset price tree
+        for K in strikes:
+            for cls in [bt.EuropeanCallStockOption, bt.AmericanPutStockOption]:
+                option = cls(K = K, **params)
+                price = option.price
+
+                price_uncached = cls(K = K, cache = False, **params).price
+                self.assertAlmostEqual(
+                    price, price_uncached, places = 12,
+                    msg = f"Cached asset tree gives a different {cls.__name__} price. Expected {price_uncached}, got {price}"
+                )
+
+        self.assertEqual(
+            bt.ASSET_TREE_CACHE.misses, 1,
+            msg = f"Asset price tree must be built once. Built {bt.ASSET_TREE_CACHE.misses} times."
+        )
+
+        # least recently used trees are evicted
+        cache = bt.AssetTreeCache(maxsize = 2)
+        for key in range(3):
+            cache.get(key, lambda: np.zeros((2, 2)))
+
+        self.assertNotIn(0, cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_greeks(self):
+
+        params = dict(S0 = 100, K = 105, r = 0.05, q = 0.01, vol = 0.2, T = 1, N = 800)
+        h = 1e-4
+
+        # ground truth: Black-Scholes greeks by central differences
+        def bs_call(**bumps):
+            return derivatives.BlackScholes(**{ **{ k: v for k, v in params.items() if k != 'N' }, **bumps }).call
+
+        expected_greeks = {
+            'delta': (bs_call(S0 = 100 + h) - bs_call(S0 = 100 - h)) / (2 * h),
+            'gamma': (bs_call(S0 = 100 + h) - 2 * bs_call() + bs_call(S0 = 100 - h)) / h**2,
+            'theta': -(bs_call(T = 1 + h) - bs_call(T = 1 - h)) / (2 * h),
+            'vega': (bs_call(vol = 0.2 + h) - bs_call(vol = 0.2 - h)) / (2 * h),
+            'rho': (bs_call(r = 0.05 + h) - bs_call(r = 0.05 - h)) / (2 * h),
+        }
+
+        option = bt.EuropeanCallStockOption(**params)
+        option_rolling = bt.EuropeanCallStockOption(full_tree = False, **params)
+
+        for greek, greek_expected in expected_greeks.items():
+            greek_tree = getattr(option, greek)
+
+            self.assertAlmostEqual(
+                greek_tree, greek_expected, delta = 1e-2 * abs(greek_expected),
+                msg = f"Wrong {greek} for EuropeanCallStockOption. Expected {greek_expected}, got {greek_tree}"
+            )
+
+            self.assertAlmostEqual(
+                getattr(option_rolling, greek), greek_tree, places = 8,
+                msg = f"Price-only {greek} differs from the full tree {greek}."
+            )
+
+        # price and the tree greeks come from a single pass, in every mode
+        for kwargs in [ dict(), dict(full_tree = False), dict(control_variate = True), dict(richardson = True) ]:
+            recorder = bt.MetricsRecorder()
+            option = bt.AmericanPutStockOption(callbacks = [recorder], cache = False, **kwargs, **params)
+            for _ in range(2):
+                option.price, option.delta, option.gamma, option.theta
+
+            phases = list(recorder.to_frame()['phase'])
+            phases_expected = (
+                ['asset_tree', 'derivative_tree'] if not kwargs 
+                else ['derivative_price'] * (2 if 'richardson' in kwargs else 1)
+            )
+            self.assertEqual(phases, phases_expected, msg = f"Greeks with {kwargs} rebuilt the tree.")
+
+    def test_fast_convergence_lattices(self):
+
+        params = dict(S0 = 100, K = 105, r = 0.05, q = 0.01, vol = 0.2, T = 1)
+        bs = derivatives.BlackScholes(**params)
+
+        # Leisen-Reimer and smoothed trees reach cent-level accuracy with few steps
+        for der_model, price_expected, N in [
+            (bt.EuropeanCallStockOptionLR, bs.call, 26),
+            (bt.EuropeanPutStockOptionLR, bs.put, 26),
+            (bt.EuropeanCallStockOptionSmoothed, bs.call, 100),
+            (bt.EuropeanPutStockOptionSmoothed, bs.put, 100),
+        ]:
+            price = der_model(N = N, **params).price
+
+            self.assertAlmostEqual(
+                price, price_expected, delta = 5e-3,
+                msg = f"Wrong {der_model.__name__} price with N = {N}. Expected {price_expected}, got {price}"
+            )
+
+        # Leisen-Reimer trees need an odd number of steps
+        self.assertEqual(bt.EuropeanCallStockOptionLR(N = 51, **params).N, 52)
+
+    def test_richardson_control_variate(self):
+
+        params = dict(S0 = 100, K = 105, r = 0.05, q = 0.01, vol = 0.2, T = 1)
+
+        # ground truth: smoothed tree with N = 20001 (CRR tree with N = 20001 gives 9.047354)
+        price_expected = 9.047341
+
+        option = bt.AmericanPutStockOptionSmoothed(N = 501, richardson = True, control_variate = True, **params)
+        price = option.price
+
+        self.assertAlmostEqual(
+            price, price_expected, delta = 1e-4,
+            msg = f"Wrong extrapolated AmericanPutStockOptionSmoothed price. Expected {price_expected}, got {price}"
+        )
+
+        # the european twin rolled back in the same pass is the european option
+        _, price_twin = bt.AmericanPutStockOption(N = 201, full_tree = False, **params).build_derivative_price(european_twin = True)
+        price_european = bt.EuropeanPutStockOption(N = 201, **params).price
+
+        self.assertAlmostEqual(
+            price_twin, price_european, places = 10,
+            msg = f"European twin differs from the european option. Expected {price_european}, got {price_twin}"
+        )
+
+        # control variates on array parameters: one price per contract
+        strikes = np.array([95., 105.])
+        chain = bt.price_chain(
+            S0 = 100, K = strikes, T = 1, vol = 0.2, r = 0.05, q = 0.01,
+            option_type = 'put', exercise = 'american', N = 201, control_variate = True
+        )
+        for i, strike in enumerate(strikes):
+            price_expected = bt.AmericanPutStockOption(N = 201, control_variate = True, **{ **params, 'K': strike }).price
+            self.assertAlmostEqual(
+                chain[i], price_expected, places = 10,
+                msg = f"Wrong control variate chain price for K = {strike}. Expected {price_expected}, got {chain[i]}"
+            )
+
+        option = bt.AmericanPutStockOption(N = 101, control_variate = True, **params)
+        for greek in ['vega', 'rho']:
+            value = getattr(option, greek)
+            value_plain = getattr(bt.AmericanPutStockOption(N = 101, **params), greek)
+            self.assertEqual(np.ndim(value), 0, msg = f"Control variate {greek} must be a scalar. Got {value}")
+            self.assertAlmostEqual(
+                value, value_plain, delta = 0.05 * abs(value_plain),
+                msg = f"Control variate {greek} too far from the tree {greek}. Expected about {value_plain}, got {value}"
+            )
+
+        # greeks read from the tree of the model itself
+        plain = bt.AmericanPutStockOption(N = 101, **params)
+        for kwargs in [ dict(richardson = True), dict(control_variate = True), dict(richardson = True, full_tree = False) ]:
+            option = bt.AmericanPutStockOption(N = 101, **kwargs, **params)
+            for greek in ['delta', 'gamma', 'theta']:
+                self.assertAlmostEqual(
+                    getattr(option, greek), getattr(plain, greek), places = 10,
+                    msg = f"Wrong {greek} with {kwargs}. Expected {getattr(plain, greek)}, got {getattr(option, greek)}"
+                )
+
+        # european Leisen-Reimer errors shrink like 1 / steps**2: the extrapolation doesn't apply
+        with self.assertRaises(ValueError):
+            bt.EuropeanPutStockOptionLR(N = 102, richardson = True, **params)
+
+        # early exercise brings them back to 1 / steps: the extrapolation applies to american options
+        price_american = 9.047341
+        plain = bt.AmericanPutStockOptionLR(N = 202, **params).price
+        price = bt.AmericanPutStockOptionLR(N = 202, richardson = True, **params).price
+
+        self.assertLess(
+            abs(price - price_american), abs(plain - price_american) / 4,
+            msg = f"Extrapolated AmericanPutStockOptionLR price {price} not closer to {price_american} than the plain price {plain}"
+        )
+
+    def test_trinomial(self):
+
+        params = dict(S0 = 100, K = 105, r = 0.05, q = 0.01, vol = 0.2, T = 1)
+        bs = derivatives.BlackScholes(**params)
+
+        # ground truth: Black-Scholes for european options, smoothed binary tree with N = 20001 for the american put
+        for der_model, price_expected, N in [
+            (bt.EuropeanCallStockOptionTrinomial, bs.call, 51),
+            (bt.EuropeanPutStockOptionTrinomial, bs.put, 51),
+            (bt.AmericanPutStockOptionTrinomial, 9.047341, 101),
+        ]:
+            option = der_model(N = N, **params)
+            price = option.price
+
+            self.assertAlmostEqual(
+                price, price_expected, delta = 1e-2,
+                msg = f"Wrong {der_model.__name__} price with N = {N}. Expected {price_expected}, got {price}"
+            )
+
+            self.assertEqual(
+                option.asset_price_tree.shape, (N, 2 * N - 1),
+                msg = f"Trinomial asset tree must have 2N - 1 columns."
+            )
+
+    def test_price_to_tolerance(self):
+
+        params = dict(S0 = 100, K = 105, r = 0.05, q = 0.01, vol = 0.2, T = 1)
+
+        # ground truth: smoothed tree with N = 20001
+        price_expected = 9.047341
+
+        option = bt.AmericanPutStockOptionSmoothed(N = 26, richardson = True, **params)
+        price, N = option.price_to_tolerance(atol = 1e-3)
+
+        self.assertAlmostEqual(
+            price, price_expected, delta = 1e-3,
+            msg = f"Wrong price to tolerance. Expected {price_expected}, got {price} (N = {N})"
+        )
+        self.assertLessEqual(N, 401, msg = f"Price to tolerance refined the tree more than needed (N = {N}).")
+
+        with self.assertRaises(TypeError, msg = "price_to_tolerance: must raise TypeError without tolerances."):
+            option.price_to_tolerance()
+
+    def test_exercise_boundary(self):
+
+        params = dict(S0 = 100, K = 105, r = 0.05, q = 0.01, vol = 0.2, T = 1, N = 201)
+
+        put = bt.AmericanPutStockOption(**params)
+        boundary = put.exercise_boundary
+        known = boundary[~np.isnan(boundary)]
+
+        self.assertEqual(boundary.shape, (params['N'],))
+        self.assertEqual(boundary[-1], params['K'], msg = "At expiration, the exercise boundary must be the strike.")
+        self.assertTrue(np.all(known <= params['K']), msg = "Put exercise boundary must be below the strike.")
+
+        # without dividends, an american call is never exercised early
+        call = bt.AmericanCallStockOption(**{ **params, 'q': 0 })
+        self.assertEqual(
+            np.count_nonzero(~np.isnan(call.exercise_boundary)), 1,
+            msg = "American call without dividends must only be exercised at expiration."
+        )
+
+        # small spot moves are repriced from the cached tree
+        for spot in [99, 101]:
+            price_expected = bt.AmericanPutStockOption(**{ **params, 'S0': spot }).price
+            price = put.reprice(spot)
+
+            self.assertAlmostEqual(
+                price, price_expected, delta = 1e-2,
+                msg = f"Wrong repriced american put at spot {spot}. Expected {price_expected}, got {price}"
+            )
+
+        # deep in the money, the put is exercised
+        self.assertEqual(put.reprice(80), params['K'] - 80)
+
+        # repricing doesn't roll the tree back again
+        for kwargs in [ dict(), dict(full_tree = False) ]:
+            recorder = bt.MetricsRecorder()
+            put = bt.AmericanPutStockOption(callbacks = [recorder], cache = False, **kwargs, **params)
+            _ = put.exercise_boundary
+            phases = list(recorder.to_frame()['phase'])
+
+            for spot in [99, 101, 80]:
+                put.reprice(spot)
+
+            self.assertEqual(
+                list(recorder.to_frame()['phase']), phases, 
+                msg = f"reprice with {kwargs} rebuilt the tree."
+            )
+
+    def test_bermudan(self):
+
+        params = dict(S0 = 100, K = 105, r = 0.05, q = 0.01, vol = 0.2, T = 1, N = 241)
+
+        european = bt.EuropeanPutStockOption(**params).price
+        american = bt.AmericanPutStockOption(**params).price
+        monthly = bt.BermudanPutStockOption(exercise_dates = np.arange(1, 12) / 12, **params)
+
+        # no exercise dates: european option. every step an exercise date: american option
+        for dates, price_expected in [(None, european), (np.arange(params['N']) / (params['N'] - 1), american)]:
+            price = bt.BermudanPutStockOption(exercise_dates = dates, **params).price
+            self.assertAlmostEqual(
+                price, price_expected, places = 10,
+                msg = f"Wrong bermudan put price. Expected {price_expected}, got {price}"
+            )
+
+        self.assertTrue(european < monthly.price < american, msg = "Bermudan put must be priced between european and american puts.")
+        np.testing.assert_array_equal(monthly.exercise_steps, np.arange(1, 12) * 20)
+
+        # the early exercise rule only applies on the exercise steps
+        exercised = np.flatnonzero(~np.isnan(monthly.exercise_boundary))
+        self.assertTrue(set(exercised) <= set(monthly.exercise_steps) | { params['N'] - 1 })
+
+        # exercise dates given as dates
+        dated = bt.BermudanPutStockOption(exercise_dates = ['01/04/2024', '01/07/2024'], base_date = '01/01/2024', **params)
+        np.testing.assert_array_equal(dated.exercise_steps, [60, 120])
+
+        with self.assertRaises(TypeError):
+            bt.BermudanPutStockOption(exercise_dates = ['01/04/2024'], **params)
+
+    def test_barrier(self):
+
+        params = dict(S0 = 100, K = 100, r = 0.05, vol = 0.2, T = 1, barrier = 90)
+        S0, K, r, vol, T, H = [ params[key] for key in ['S0', 'K', 'r', 'vol', 'T', 'barrier'] ]
+
+        # closed form (continuously monitored) down-and-in call, barrier below the strike
+        lamb = (r + vol**2 / 2) / vol**2
+        y = np.log(H**2 / (S0 * K)) / (vol * np.sqrt(T)) + lamb * vol * np.sqrt(T)
+        knock_in_expected = (
+            S0 * (H / S0)**(2 * lamb) * norm.cdf(y) - 
+            K * np.exp(-r * T) * (H / S0)**(2 * lamb - 2) * norm.cdf(y - vol * np.sqrt(T))
+        )
+        vanilla = derivatives.BlackScholes(S0 = S0, K = K, r = r, T = T, vol = vol).call
+
+        for model, price_expected in [
+            (bt.EuropeanDownAndInCallStockOption, knock_in_expected),
+            (bt.EuropeanDownAndOutCallStockOption, vanilla - knock_in_expected)
+        ]:
+            # aligned barrier: small N is enough
+            price = model(N = 101, **params).price
+            price_unaligned = model(N = 101, align_barrier = False, **params).price
+
+            self.assertAlmostEqual(
+                price, price_expected, delta = 3e-2,
+                msg = f"Wrong {model.__name__} price. Expected {price_expected}, got {price}"
+            )
+            self.assertLess(abs(price - price_expected), abs(price_unaligned - price_expected))
+
+        # a barrier that is never reached
+        vanilla_params = { key: value for key, value in params.items() if key != 'barrier' }
+        out_of_reach = bt.EuropeanUpAndOutCallStockOption(N = 101, **vanilla_params).price
+        self.assertEqual(out_of_reach, bt.EuropeanCallStockOption(N = 101, **vanilla_params).price)
+
+        # american knock-out puts are worth less than american puts and at least their european counterparts
+        american = bt.AmericanDownAndOutPutStockOption(N = 101, **params).price
+        european = bt.EuropeanDownAndOutPutStockOption(N = 101, **params).price
+        self.assertTrue(european <= american < bt.AmericanPutStockOption(N = 101, **vanilla_params).price)
+
+        self.assertIn('never reached', str(bt.EuropeanDownAndOutCallStockOption(N = 101, **vanilla_params)))
+
+        # refined trees stay aligned to the barrier
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            price, N = bt.EuropeanDownAndOutCallStockOption(N = 101, **params).price_to_tolerance(atol = 1e-3)
+
+        self.assertAlmostEqual(
+            price, vanilla - knock_in_expected, delta = 5e-3,
+            msg = f"Wrong EuropeanDownAndOutCallStockOption price to tolerance. Expected {vanilla - knock_in_expected}, got {price} (N = {N})"
+        )
+
+        with self.assertRaises(ValueError):
+            bt.EuropeanDownAndOutCallStockOption(N = 101, control_variate = True, **params)
+
+        with self.assertRaises(ValueError):
+            bt.EuropeanDownAndOutCallStockOption(N = 101, richardson = True, **params)
+
+    def test_price_book(self):
+
+        params = self.params['Stock']
+        models = ['EuropeanCallStockOption', 'AmericanPutStockOption', 'AmericanPutCurrencyOptionTrinomial']
+
+        book = pd.DataFrame({
+            'model': models * 3,
+            'S0': params['S0'],
+            'K': params['S0'] * np.linspace(0.8, 1.2, 9),
+            'r': params['r'],
+            'q': 0.01,
+            'vol': params['vol'],
+            'T': np.linspace(0.25, 1, 9),
+            'N': [51, 51, 51, 101, 101, 101, 51, 51, 51]
+        }, index = list('abcdefghi'))
+
+        # bad contracts
+        book.loc['b', 'vol'] = -0.2
+        book.loc['f', 'model'] = 'StraddleStockOption'
+        book.loc['h', 'S0'] = np.nan
+
+        result = bt.price_book(book, processes = 2)
+
+        self.assertTrue(result.index.equals(book.index))
+        self.assertEqual(list(result['error'].notna()), [ i in 'bfh' for i in 'abcdefghi' ])
+        self.assertTrue(result.loc[list('bfh'), 'price'].isna().all())
+
+        for i, contract in book.drop(list('bfh')).iterrows():
+            model = getattr(bt, contract['model'])
+            price_expected = model(**contract.drop(['model', 'N']), N = int(contract['N'])).price
+
+            self.assertAlmostEqual(
+                result.loc[i, 'price'], price_expected, places = 10,
+                msg = f"Wrong book price for contract {i} ({contract['model']}). Expected {price_expected}, got {result.loc[i, 'price']}"
+            )
+
+        # contract terms of barrier and bermudan models
+        book = pd.DataFrame({
+            'model': ['EuropeanUpAndInCallStockOption', 'EuropeanUpAndOutCallStockOption', 'BermudanPutStockOption', 'BermudanPutStockOption'],
+            'barrier': [params['S0'] * 1.1, params['S0'] * 1.1, np.nan, np.nan],
+            'exercise_dates': [None, None, [0.1], [0.05, 0.1, 0.15]],
+            'N': 101, **{ name: params[name] for name in ['S0', 'K', 'r', 'q', 'vol', 'T'] },
+        })
+        result = bt.price_book(book, processes = 1)
+
+        for i, contract in book.iterrows():
+            terms = { 'barrier': contract['barrier'] } if i < 2 else { 'exercise_dates': contract['exercise_dates'] }
+            price_expected = getattr(bt, contract['model'])(**{ **params, **terms, 'N': 101 }).price
+
+            self.assertAlmostEqual(
+                result.loc[i, 'price'], price_expected, places = 10,
+                msg = f"Wrong book price for contract {i} ({contract['model']}). Expected {price_expected}, got {result.loc[i, 'price']}"
+            )
+
+        # without their terms, these contracts are errors
+        result = bt.price_book(book.drop(columns = ['barrier', 'exercise_dates']), processes = 1)
+        self.assertTrue(result['price'].isna().all() and result['error'].notna().all())
+
+    def test_closed_forms(self):
+
+        params = { k: v for k, v in self.params['Stock'].items() if k not in ['N', 'rf', 'q'] }
+        rf = np.log(1 + 0.01507)
+
+        # european trees converge to the closed form of their asset
+        closed_forms = {
+            'EuropeanCallFuturesOption': derivatives.Black76(**params).call,
+            'EuropeanPutFuturesOption': derivatives.Black76(**params).put,
+            'EuropeanCallCurrencyOption': derivatives.GarmanKohlhagen(**params, rf = rf).call,
+            'EuropeanPutCurrencyOption': derivatives.GarmanKohlhagen(**params, rf = rf).put,
+        }
+
+        for model_name, price_expected in closed_forms.items():
+            option = getattr(bt, model_name)(**params, rf = rf, N = 1001)
+            
+            self.assertAlmostEqual(
+                option.price, price_expected, delta = 2e-3,
+                msg = f'{model_name}: tree price does not converge to the closed form. Expected {price_expected:.6f}, got {option.price:.6f}'
+            )
+            self.assertAlmostEqual(
+                option.closed_form_price(spot = option.S0, strike = option.K, T = option.T), price_expected, places = 12,
+                msg = f'{model_name}: wrong closed form model.'
+            )
+
+        # the closed forms are control variates of the american trees
+        price_fine = bt.AmericanPutFuturesOption(**params, N = 4001).price
+        price = bt.AmericanPutFuturesOption(**params, N = 101).price
+        price_cv = bt.AmericanPutFuturesOption(**params, N = 101, control_variate = True).price
+        self.assertLess(
+            abs(price_cv - price_fine), abs(price - price_fine),
+            msg = f'AmericanPutFuturesOption: control variate must reduce the error. Got {price_cv:.6f} and {price:.6f} (fine tree {price_fine:.6f})'
+        )
+
+        # books price european vanilla contracts with the closed forms
+        book = pd.DataFrame({
+            'model': ['EuropeanCallFuturesOption', 'EuropeanPutCurrencyOption', 'AmericanPutFuturesOption'],
+            'q': [0, rf, 0], 'N': 101, **params,
+        })
+        result = bt.price_book(book, processes = 1, closed_form = True)
+        prices_expected = [closed_forms['EuropeanCallFuturesOption'], closed_forms['EuropeanPutCurrencyOption'], price]
+
+        for i, price_expected in enumerate(prices_expected):
+            self.assertAlmostEqual(
+                result['price'][i], price_expected, places = 10,
+                msg = f"Wrong closed form book price for contract {i} ({book['model'][i]}). Expected {price_expected}, got {result['price'][i]}"
+            )
+
+        # a bad contract in the batch: the others are still priced in closed form
+        book = pd.DataFrame({ 'model': 'EuropeanCallFuturesOption', 'N': 101, **params, 'vol': [params['vol'], -0.2, params['vol']] })
+        result = bt.price_book(book, processes = 1, closed_form = True)
+
+        self.assertEqual(list(result['error'].notna()), [False, True, False])
+        for i in [0, 2]:
+            self.assertAlmostEqual(
+                result['price'][i], closed_forms['EuropeanCallFuturesOption'], places = 10,
+                msg = f"Contract {i} was not priced in closed form after a bad contract in its batch. Got {result['price'][i]}"
+            )
+
+    def test_jit_kernels(self):
+
+        params = self.params['Stock']
+
+        # the compiled kernels must give the same prices, greeks and exercise boundaries as the numpy path
+        for model in [bt.EuropeanCallStockOption, bt.AmericanPutStockOption, bt.AmericanCallCurrencyOptionLR]:
+            for full_tree in [True, False]:
+                option = model(full_tree = full_tree, **params)
+                option_numpy = model(full_tree = full_tree, jit = False, **params)
+
+                for attribute in ['price', 'delta', 'gamma', 'theta']:
+                    value, value_expected = getattr(option, attribute), getattr(option_numpy, attribute)
+                    self.assertAlmostEqual(
+                        value, value_expected, places = 12,
+                        msg = f"Compiled {model.__name__} {attribute} differs from numpy. Expected {value_expected}, got {value}"
+                    )
+
+                if issubclass(model, bt.AmericanOption):
+                    np.testing.assert_allclose(option.exercise_boundary, option_numpy.exercise_boundary, rtol = 1e-12)
+
+        # models with other level rules are not priced by the kernels
+        for model in [bt.BermudanPutStockOption, bt.AmericanPutStockOptionSmoothed, bt.AmericanPutStockOptionTrinomial]:
+            self.assertIsNone(model(**params)._get_kernel_rules())
+
+        # the kernels also run as plain python functions (without numba)
+        option = bt.AmericanPutStockOption(jit = False, **params)
+        u, d, p = option.calc_riskfree_proportion()
+        spots = option.build_asset_level(current_step = option.N - 1, u = u, d = d)
+        values = option.option_price(spot = spots, strike = option.K)
+        boundary = option._get_kernel_boundary()
+
+        kernel = getattr(bt.kernels.binomial_backward_induction, 'py_func', bt.kernels.binomial_backward_induction)
+        kernel(values, spots, d, p, np.exp(-option.r * option.dT), option.K, False, True, option.N - 2, 0, boundary)
+
+        self.assertAlmostEqual(values[0], option.price, places = 12)
+        np.testing.assert_allclose(boundary, option.exercise_boundary, rtol = 1e-12)
+
+    def test_packed_tree(self):
+
+        tree = bt.PackedTree([1, 2, 3])
+        tree[1] = [1, 2]
+        tree[2, 1:] = [4, 5]
+
+        self.assertEqual(tree.nodes.size, 6)
+        self.assertEqual(tree.shape, (3, 3))
+        self.assertEqual(tree[2, 2], 5)
+        self.assertEqual(tree[-1, 1], 4)
+        np.testing.assert_array_equal(tree.to_dense(), [[0, 0, 0], [1, 2, 0], [0, 4, 5]])
+        np.testing.assert_array_equal(bt.PackedTree.from_dense(tree.to_dense(), [1, 2, 3]).nodes, tree.nodes)
+
+        # packed trees must hold the same prices as the dense ones, in about half the memory
+        params = self.params['Stock']
+        for model in [bt.AmericanPutStockOption, bt.EuropeanCallStockOptionTrinomial, bt.EuropeanDownAndOutCallStockOption]:
+            option = model(packed = True, jit = False, **params)
+            option_dense = model(jit = False, **params)
+
+            self.assertAlmostEqual(
+                option.price, option_dense.price, places = 10,
+                msg = f"Packed {model.__name__} price differs from the dense one. Expected {option_dense.price}, got {option.price}"
+            )
+            self.assertAlmostEqual(option.gamma, option_dense.gamma, places = 10)
+            self.assertIsInstance(option.derivative_price_tree, bt.PackedTree)
+            np.testing.assert_allclose(option.derivative_price_tree.to_dense(), option_dense.derivative_price_tree, atol = 1e-10)
+            self.assertLess(option.asset_price_tree.nbytes, 0.6 * option_dense.asset_price_tree.nbytes)
+
+    def test_tree_dir(self):
+
+        params = self.params['Stock']
+        price_expected = bt.AmericanPutStockOption(**params).price
+
+        for packed in [False, True]:
+            with tempfile.TemporaryDirectory() as tree_dir:
+                option = bt.AmericanPutStockOption(tree_dir = tree_dir, packed = packed, **params)
+
+                self.assertAlmostEqual(option.price, price_expected, places = 10)
+
+                # trees are reopened from disk, memory-mapped
+                self.assertEqual(os.path.dirname(option.tree_path), tree_dir)
+                for name in ['asset_price_tree', 'derivative_price_tree']:
+                    tree = bt.load_tree(os.path.join(option.tree_path, f'{name}.npy'))
+                    self.assertIsInstance(tree, bt.PackedTree if packed else np.memmap)
+                    self.assertIsInstance(getattr(tree, 'nodes', tree), np.memmap)
+                    np.testing.assert_array_equal(np.asarray(tree), np.asarray(getattr(option, name)))
+
+                # another model on the same directory doesn't overwrite the trees
+                derivative_tree = np.array(option.derivative_price_tree)
+                other = bt.AmericanPutStockOption(tree_dir = tree_dir, packed = packed, **{ **params, 'K': params['K'] * 0.9 })
+                _ = other.price
+
+                self.assertNotEqual(other.tree_path, option.tree_path)
+                np.testing.assert_array_equal(np.asarray(option.derivative_price_tree), derivative_tree)
+
+                # release the memory maps before the directory is removed
+                del option, other, tree
+
+    def test_float32(self):
+
+        params = { **self.params['Stock'], 'N': 1001 }
+
+        # float32 prices must stay within N * 5e-8 (relative) of float64 prices
+        for model in [bt.AmericanPutStockOption, bt.EuropeanCallStockOptionTrinomial, bt.AmericanPutStockOptionSmoothed]:
+            for full_tree in [True, False]:
+                option = model(dtype = np.float32, full_tree = full_tree, **params)
+                price_expected = model(full_tree = full_tree, **params).price
+
+                self.assertAlmostEqual(
+                    option.price, price_expected, delta = 5e-5 * price_expected,
+                    msg = f"float32 {model.__name__} price too far from float64. Expected {price_expected}, got {option.price}"
+                )
+
+                if full_tree:
+                    self.assertEqual(option.derivative_price_tree.dtype, np.float32)
+
+        # batch pricing
+        S0 = params['S0']
+        K = S0 * np.linspace(0.8, 1.2, 9)
+        chain = dict(S0 = S0, K = K, T = 0.5, vol = params['vol'], r = params['r'], option_type = 'put', exercise = 'american', N = 201)
+
+        np.testing.assert_allclose(bt.price_chain(dtype = np.float32, **chain), bt.price_chain(**chain), rtol = 1e-5)
+
+    def test_callbacks(self):
+
+        class LevelCounter(bt.TreeCallback):
+            def __init__(self):
+                self.levels = {}
+
+            def on_level(self, model, phase, step):
+                self.levels[phase] = self.levels.get(phase, 0) + 1
+
+        params = self.params['Stock']
+        N = params['N']
+        recorder, counter = bt.MetricsRecorder(), LevelCounter()
+
+        # the asset tree isn't taken from the cache, so it is built
+        bt.AmericanPutStockOption(callbacks = [recorder, counter], jit = False, cache = False, **params).price
+        bt.AmericanPutStockOption(callbacks = [recorder, counter], jit = False, full_tree = False, **params).price
+
+        metrics = recorder.to_frame()
+        self.assertEqual(list(metrics['phase']), ['asset_tree', 'derivative_tree', 'derivative_price'])
+        self.assertEqual(list(metrics['levels']), [N, N - 1, N - 1])
+        self.assertEqual(metrics.loc[0, 'bytes'], N * N * 8)
+        self.assertTrue((metrics['seconds'] >= 0).all())
+        self.assertEqual(counter.levels, { 'asset_tree': N, 'derivative_tree': N - 1, 'derivative_price': N - 1 })
+        self.assertFalse(metrics['cache_hit'].any() or metrics['failed'].any())
+
+        # an asset tree from the cache is flagged, and allocates nothing
+        recorder = bt.MetricsRecorder()
+        cache_params = { **params, 'S0': params['S0'] * 1.0123 }
+        for _ in range(2):
+            bt.AmericanPutStockOption(callbacks = [recorder], jit = False, **cache_params).price
+
+        asset_metrics = recorder.to_frame()
+        asset_metrics = asset_metrics[asset_metrics['phase'] == 'asset_tree']
+        self.assertEqual(list(asset_metrics['cache_hit']), [False, True])
+        self.assertEqual(list(asset_metrics['bytes']), [N * N * 8, 0])
+
+        # a phase that raises still ends, closing its progress bar
+        class Failure(bt.TreeCallback):
+            def on_level(self, model, phase, step):
+                raise RuntimeError('failed level')
+
+        recorder = bt.MetricsRecorder()
+        option = bt.AmericanPutStockOption(callbacks = [recorder, Failure()], progressbar = True, jit = False, cache = False, **params)
+        with self.assertRaises(RuntimeError):
+            option.price
+
+        self.assertEqual(list(recorder.to_frame()['failed']), [True])
+        self.assertEqual(option._progress.bars, {})
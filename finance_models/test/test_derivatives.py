@@ -590,6 +590,133 @@ class TestDerivatives(unittest.TestCase):
             ):
                 bs = derivatives.BlackScholes(**params_minus1)
 
+    def test_BS_greeks(self):
+        params = dict(S0 = 10., K = 11., T = 0.5, r = 0.0915, q = 0.03, vol = 0.3)
+        bs = derivatives.BlackScholes(**params)
+        greeks = bs.greeks()
+
+        # greeks against central finite differences of the prices
+        bumps = dict(S0 = 1e-4, vol = 1e-5, r = 1e-5, T = 1e-5)
+        expected = {}
+        for param, bump in bumps.items():
+            up = derivatives.BlackScholes(**{ **params, param: params[param] + bump })
+            down = derivatives.BlackScholes(**{ **params, param: params[param] - bump })
+            for option in ['call', 'put']:
+                fd = (getattr(up, option) - getattr(down, option)) / (2 * bump)
+                name = { 'S0': 'delta', 'vol': 'vega', 'r': 'rho', 'T': 'theta' }[param]
+                expected[name if name == 'vega' else f'{option}_{name}'] = -fd if param == 'T' else fd
+            
+            if param == 'S0':
+                expected['gamma'] = (up.call - 2 * bs.call + down.call) / bump**2
+
+        for name, value in expected.items():
+            self.assertAlmostEqual(
+                greeks[name], value, delta = 1e-3 if name == 'gamma' else 1e-5,
+                msg = f'BlackScholes: wrong {name}. Expected {value:.6f}, got {greeks[name]:.6f}'
+            )
+
+        # put-call parity
+        parity = params['S0'] * np.exp(-params['q'] * params['T']) - params['K'] * np.exp(-params['r'] * params['T'])
+        self.assertAlmostEqual(
+            greeks['call'] - greeks['put'], parity, delta = 1e-12,
+            msg = f'BlackScholes: put-call parity does not hold.'
+        )
+
+        # arrays are broadcast, element by element equal to the scalar pricing
+        strikes = np.array([9., 10., 11., 12.])
+        vols = np.array([[0.2], [0.3]])
+        bs_array = derivatives.BlackScholes(**{ **params, 'K': strikes, 'vol': vols }).greeks()
+
+        for name, values in bs_array.items():
+            self.assertEqual(
+                np.shape(values), (2, 4),
+                msg = f'BlackScholes: wrong {name} shape. Expected (2, 4), got {np.shape(values)}'
+            )
+        
+        for i, v in enumerate(vols[:, 0]):
+            for j, k in enumerate(strikes):
+                scalar = derivatives.BlackScholes(**{ **params, 'K': k, 'vol': v }).greeks()
+                for name, value in scalar.items():
+                    self.assertAlmostEqual(
+                        bs_array[name][i, j], value, delta = 1e-12,
+                        msg = f'BlackScholes: vectorized {name} differs from scalar (K = {k}, vol = {v})'
+                    )
+
+    def test_Black76_GarmanKohlhagen(self):
+        params = dict(S0 = 10., K = 11., T = 0.5, r = 0.0915, vol = 0.3)
+        rf = 0.03
+        discount = np.exp(-params['r'] * params['T'])
+
+        # black-76 discounts the black-scholes price of an asset growing at zero rate
+        b76 = derivatives.Black76(**params)
+        bs_forward = derivatives.BlackScholes(**{ **params, 'r': 0 })
+        for option in ['call', 'put']:
+            expected = discount * getattr(bs_forward, option)
+            self.assertAlmostEqual(
+                getattr(b76, option), expected, delta = 1e-12,
+                msg = f'Black76: wrong {option} price. Expected $ {expected:.6f}, got $ {getattr(b76, option):.6f}'
+            )
+
+        # garman-kohlhagen is black-scholes with q = rf
+        gk = derivatives.GarmanKohlhagen(**params, rf = rf)
+        bs = derivatives.BlackScholes(**params, q = rf)
+        for option in ['call', 'put']:
+            self.assertEqual(getattr(gk, option), getattr(bs, option), msg = f'GarmanKohlhagen: wrong {option} price.')
+
+        # rates greeks against central finite differences
+        bump = 1e-6
+        for option in ['call', 'put']:
+            up, down = derivatives.Black76(**{ **params, 'r': params['r'] + bump }), derivatives.Black76(**{ **params, 'r': params['r'] - bump })
+            expected = (getattr(up, option) - getattr(down, option)) / (2 * bump)
+            self.assertAlmostEqual(
+                b76.greeks()[f'{option}_rho'], expected, delta = 1e-5,
+                msg = f'Black76: wrong {option} rho. Expected {expected:.6f}, got {b76.greeks()[f"{option}_rho"]:.6f}'
+            )
+
+            up, down = derivatives.GarmanKohlhagen(**params, rf = rf + bump), derivatives.GarmanKohlhagen(**params, rf = rf - bump)
+            expected = (getattr(up, option) - getattr(down, option)) / (2 * bump)
+            self.assertAlmostEqual(
+                gk.greeks()[f'{option}_rho_foreign'], expected, delta = 1e-5,
+                msg = f'GarmanKohlhagen: wrong {option} foreign rho. Expected {expected:.6f}, got {gk.greeks()[f"{option}_rho_foreign"]:.6f}'
+            )
+
+    def test_implied_vol(self):
+        rng = np.random.default_rng(0)
+        K = rng.uniform(70, 130, 1000)
+        T = rng.uniform(0.05, 2, 1000)
+        vols = rng.uniform(0.05, 1, 1000)
+        option_type = np.where(rng.random(1000) < 0.5, 'call', 'put')
+
+        bs = derivatives.BlackScholes(S0 = 100, K = K, r = 0.0915, T = T, vol = vols, q = 0.02)
+        prices = np.where(option_type == 'call', bs.call, bs.put)
+        
+        iv, converged = derivatives.implied_vol(prices, S0 = 100, K = K, r = 0.0915, T = T, q = 0.02, option_type = option_type)
+
+        self.assertTrue(converged.all(), msg = f'implied_vol: {(~converged).sum()} quotes did not converge.')
+
+        # well-conditioned quotes (vega not negligible) recover their volatility
+        identifiable = bs.vega > 1e-2
+        error = np.abs(iv - vols)[identifiable].max()
+        self.assertLess(error, 1e-6, msg = f'implied_vol: wrong volatilities. Largest error {error:.2e}')
+
+        # scalars in, scalars out
+        iv_scalar, converged_scalar = derivatives.implied_vol(prices[0], S0 = 100, K = K[0], r = 0.0915, T = T[0], q = 0.02, option_type = option_type[0])
+        self.assertAlmostEqual(
+            iv_scalar, vols[0], delta = 1e-6,
+            msg = f'implied_vol: wrong scalar volatility. Expected {vols[0]:.6f}, got {iv_scalar:.6f}'
+        )
+        self.assertIsInstance(iv_scalar, float, msg = f'implied_vol: scalar quote must return a float.')
+
+        # prices out of the no-arbitrage bounds have no solution
+        iv_out, converged_out = derivatives.implied_vol([1e-3, 150.], S0 = 100, K = 100, r = 0.0915, T = 1)
+        self.assertTrue(
+            np.isnan(iv_out).all() and not converged_out.any(),
+            msg = f'implied_vol: prices out of the no-arbitrage bounds must return NaN. Got {iv_out}'
+        )
+
+        with self.assertRaises(ValueError, msg = f"implied_vol: Must raise ValueError with an unknown option_type."):
+            derivatives.implied_vol(prices[0], S0 = 100, K = K[0], r = 0.0915, T = T[0], option_type = 'straddle')
+
     def test_BSP_value(self):
         bs = derivatives.BlackScholesPortfolio(
             portfolio = self.portfolio,
@@ -614,6 +741,37 @@ class TestDerivatives(unittest.TestCase):
             msg = f'BlackScholesPortfolio: wrong put price. Expected $ {bs_put_expected:.4f}, got $ {bs_put:.4f}' 
         )
     
+    def test_BSP_price_series(self):
+        params = dict(portfolio = self.portfolio, K = 245_000, r = 9.15 / 100, T = 1/12)
+        base_date = pd.Timestamp('2022-05-11')
+        bs = derivatives.BlackScholesPortfolio(volmodel = 'hist', window = 20, base_date = base_date, **params)
+        prices = bs.price_series()
+
+        expiry = base_date + pd.Timedelta(days = 365 / 12)
+        self.assertTrue(
+            (prices.index < expiry).all() and prices.index[0] == self.portfolio.portfolio_total.index[0],
+            msg = f'BlackScholesPortfolio: price series must span from the first date of the portfolio to the expiry.'
+        )
+        self.assertTrue(
+            (np.diff(prices['T']) < 0).all(), 
+            msg = f'BlackScholesPortfolio: time to expiry must roll down with the dates.'
+        )
+
+        # each date matches a single-date instance with the time to expiry rolled down
+        for date in [ '2022-02-15', '2022-05-11', '2022-06-01' ]:
+            date = pd.Timestamp(date)
+            bs_date = derivatives.BlackScholesPortfolio(
+                volmodel = 'hist', window = 20, base_date = date, 
+                **{ **params, 'T': params['T'] - (date - base_date).days / 365 }
+            )
+
+            for option in [ 'call', 'put' ]:
+                expected = getattr(bs_date, option)
+                self.assertAlmostEqual(
+                    prices.loc[date, option], expected, delta = 1e-6,
+                    msg = f'BlackScholesPortfolio: wrong {option} price on {date:%Y-%m-%d}. Expected $ {expected:.4f}, got $ {prices.loc[date, option]:.4f}'
+                )
+
     def test_BSP_errors(self):
 
         params = dict(
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+from .. import derivatives
+from ..derivatives import montecarlo as mc, binomialtree as bt
+import unittest
+
+import warnings
+warnings.filterwarnings('ignore')
+
+class TestMonteCarlo(unittest.TestCase):
+    def setUp(self):
+        self.params = dict(
+            S0 = 10., K = 10., r = np.log(1 + 0.0915), q = 0.01,
+            T = 0.25, vol = 0.3, paths = 40_000, chunksize = 5_000, seed = 42
+        )
+        self.closed_form_params = { k: v for k, v in self.params.items() if k in ['S0', 'K', 'r', 'q', 'T', 'vol'] }
+
+    def test_abstractness(self):
+
+        for abc in mc.BUILDINGBLOCKS:
+            cls_name = abc.__name__
+            with self.assertRaisesRegex(
+                TypeError, 'abstract',
+                msg = f"Was able to instantiate the abstract class '{cls_name}'."
+            ):
+                c = abc(**self.params)
+
+    def test_instantiation(self):
+        for cls in mc.MODELS:
+            c = cls(**{ **self.params, 'paths': 1_000, 'steps': 10 })
+            self.assertTrue(
+                np.isfinite(c.price) and np.isfinite(c.stderr),
+                msg = f'{cls.__name__}: price and standard error must be finite.'
+            )
+
+    def test_european(self):
+        closed_forms = {
+            mc.EuropeanCallStockOption: derivatives.BlackScholes(**self.closed_form_params).call,
+            mc.EuropeanPutStockOption: derivatives.BlackScholes(**self.closed_form_params).put,
+            mc.EuropeanCallFuturesOption: derivatives.Black76(**self.closed_form_params).call,
+            mc.EuropeanPutCurrencyOption: derivatives.GarmanKohlhagen(**self.closed_form_params, rf = 0.02).put,
+        }
+
+        for cls, price_expected in closed_forms.items():
+            result = cls(**self.params, rf = 0.02).result
+
+            self.assertAlmostEqual(
+                result.price, price_expected, delta = 4 * result.stderr,
+                msg = f'{cls.__name__}: price {result.price:.4f} ± {result.stderr:.4f} too far from the closed form {price_expected:.4f}'
+            )
+
+    def test_path_dependent(self):
+        european = mc.EuropeanCallStockOption(**self.params).result
+        asian = mc.AsianCallStockOption(**self.params).result
+        lookback = mc.LookbackCallStockOption(**self.params).result
+
+        # averaging lowers the volatility, the maximum can only raise the payoff
+        self.assertLess(asian.price, european.price, msg = f'AsianCallStockOption: must be cheaper than the european call.')
+        self.assertGreater(lookback.price, european.price, msg = f'LookbackCallStockOption: must be dearer than the european call.')
+
+        # knock-in and knock-out options on the same paths add up to the european option
+        params = { **self.params, 'barrier': 11. }
+        knock_in = mc.UpAndInCallStockOption(**params).result
+        knock_out = mc.UpAndOutCallStockOption(**params).result
+        vanilla = mc.UpAndOutCallStockOption(**{ **params, 'barrier': None }).result
+
+        self.assertAlmostEqual(
+            knock_in.price + knock_out.price, vanilla.price, places = 10,
+            msg = f'Barrier options: knock-in ({knock_in.price:.4f}) and knock-out ({knock_out.price:.4f}) must add up to the vanilla option ({vanilla.price:.4f})'
+        )
+
+        # a continuously monitored barrier knocks out more often than a discrete one
+        tree_price = bt.EuropeanUpAndOutCallStockOption(**self.closed_form_params, barrier = 11., N = 201).price
+        self.assertGreater(
+            knock_out.price, tree_price - 4 * knock_out.stderr,
+            msg = f'UpAndOutCallStockOption: discretely monitored price {knock_out.price:.4f} below the continuously monitored {tree_price:.4f}'
+        )
+
+    def test_variance_reduction(self):
+        plain = mc.AsianPutStockOption(**self.params, antithetic = False).result
+        antithetic = mc.AsianPutStockOption(**self.params).result
+        control_variate = mc.AsianPutStockOption(**self.params, antithetic = False, control_variate = True).result
+
+        for name, result in [('antithetic', antithetic), ('control variate', control_variate)]:
+            self.assertLess(
+                result.stderr, plain.stderr,
+                msg = f'AsianPutStockOption: {name} must reduce the standard error. Got {result.stderr:.5f}, plain {plain.stderr:.5f}'
+            )
+            self.assertAlmostEqual(
+                result.price, plain.price, delta = 4 * plain.stderr,
+                msg = f'AsianPutStockOption: {name} price {result.price:.4f} too far from the plain price {plain.price:.4f}'
+            )
+
+        # the european option is its own control variate: exact price
+        european = mc.EuropeanPutStockOption(**self.params, control_variate = True).result
+        price_expected = derivatives.BlackScholes(**self.closed_form_params).put
+        self.assertAlmostEqual(
+            european.price, price_expected, places = 10,
+            msg = f'EuropeanPutStockOption: control variate must give the closed form price. Expected {price_expected}, got {european.price}'
+        )
+
+    def test_early_stopping(self):
+        tol = 0.02
+        result = mc.AsianCallStockOption(**{ **self.params, 'paths': 1_000_000 }, tol = tol).result
+
+        self.assertTrue(result.converged, msg = f'AsianCallStockOption: did not reach the target standard error.')
+        self.assertLessEqual(result.stderr, tol, msg = f'AsianCallStockOption: standard error {result.stderr} above the target {tol}.')
+        self.assertLess(result.paths, 1_000_000, msg = f'AsianCallStockOption: simulation did not stop early.')
+        self.assertEqual(result.paths % self.params['chunksize'], 0, msg = f'AsianCallStockOption: must stop on a whole chunk.')
+
+    def test_reproducibility(self):
+        # each chunk has its own random stream: the same seed gives the same price, however the chunks are spread
+        single = mc.LookbackPutStockOption(**self.params).result
+        pooled = mc.LookbackPutStockOption(**self.params, processes = 2).result
+        other_seed = mc.LookbackPutStockOption(**{ **self.params, 'seed': 7 }).result
+
+        self.assertAlmostEqual(
+            single.price, pooled.price, places = 10,
+            msg = f'LookbackPutStockOption: price depends on the number of processes. Got {single.price} and {pooled.price}'
+        )
+        self.assertNotEqual(single.price, other_seed.price, msg = f'LookbackPutStockOption: price does not depend on the seed.')
+
+    def test_errors(self):
+        for argname in ['paths', 'chunksize', 'steps']:
+            with self.assertRaises(ValueError, msg = f"Must raise ValueError with a non-positive '{argname}'."):
+                mc.EuropeanCallStockOption(**{ **self.params, argname: 0 })
+
+        with self.assertRaises(ValueError, msg = f'Must raise ValueError with a negative volatility.'):
+            mc.EuropeanCallStockOption(**{ **self.params, 'vol': -0.3 })
+
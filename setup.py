@@ -14,6 +14,9 @@ setup(
     install_requires = [
         'numpy', 'scipy', 'pandas', 'babel'
     ],
+    extras_require = {
+        'jit': ['numba'],
+    },
 
     classifiers = [
         'Development Status :: 5 - Production/Stable',